@@ -21,7 +21,7 @@ import faulthandler
 
 faulthandler.enable()
 
-from sys import argv
+from sys import argv, stderr
 from os import path
 
 from gi.repository import Gio
@@ -29,14 +29,59 @@ from gi.repository import Gio
 script_path: str = path.dirname(path.realpath(__file__))
 
 
+def resource_hash(data_dir: str) -> str:
+    """Hash of the gresource manifest, every file it lists and the YAML compiler."""
+    from hashlib import sha256
+    from xml.etree import ElementTree
+
+    manifest = path.join(data_dir, "org.bredos.bakery.gresource.xml")
+    files = [
+        manifest,
+        path.join(data_dir, "org.bredos.bakery.marshal.gresource.xml"),
+        path.join(data_dir, "compile_yaml.py"),
+    ]
+    for f in ElementTree.parse(manifest).iter("file"):
+        files.append(path.join(data_dir, f.text))
+    h = sha256()
+    for i in files:
+        h.update(i.encode())
+        try:
+            with open(i, "rb") as f:
+                h.update(f.read())
+        except OSError:
+            h.update(b"missing")
+    return h.hexdigest()
+
+
 def generate_gresource() -> None:
-    """Generates the gresource file."""
+    """Generates the gresource file, unless its sources are unchanged."""
     from subprocess import run
+    from sys import executable
 
-    run(
+    data_dir = path.join(script_path, "data")
+    stamp = path.join(data_dir, "org.bredos.bakery.gresource.stamp")
+    digest = resource_hash(data_dir)
+    if path.isfile(path.join(data_dir, "org.bredos.bakery.gresource")):
+        try:
+            with open(stamp) as f:
+                if f.read().strip() == digest:
+                    return
+        except OSError:
+            pass
+
+    # The pre-parsed package lists are optional, Bakery falls back to the YAML
+    if run([executable, "compile_yaml.py"], cwd=data_dir).returncode:
+        print(
+            "Warning: could not pre-parse the package lists, using the YAML",
+            file=stderr,
+        )
+    if run(
         ["glib-compile-resources", "org.bredos.bakery.gresource.xml"],
-        cwd=path.join(script_path, "data"),
-    )
+        cwd=data_dir,
+    ).returncode:
+        return
+    with open(stamp, "w") as f:
+        f.write(digest + "\n")
 
 
 def set_resources() -> None:
@@ -47,6 +92,10 @@ def set_resources() -> None:
         path.join(script_path, "data", "org.bredos.bakery.gresource")
     )
     Gio.Resource._register(resource)
+    # Pre-parsed package lists, optional
+    blobs = path.join(script_path, "data", "org.bredos.bakery.marshal.gresource")
+    if path.isfile(blobs):
+        Gio.Resource._register(Gio.Resource.load(blobs))
 
 
 if __name__ == "__main__":
@@ -18,6 +18,7 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 from datetime import datetime
+import importlib
 import os
 import locale
 from bredos.translations import setup_translations
@@ -58,6 +59,32 @@ _p = _p
 _ = _
 expected_to_fail = expected_to_fail
 
-from bakery import misc
 
-st_msgs = misc.st_msgs
+class LazyModule:
+    """
+    Stand-in for a module that is only imported on first attribute access.
+
+    Keeps heavy dependencies off the startup path of pages not using them.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def __getattr__(name: str):
+    # misc is only loaded once something asks for st_msgs
+    if name == "st_msgs":
+        from bakery import misc
+
+        return misc.st_msgs
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -17,22 +17,172 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
+import marshal
 import os
+import threading
 import gi
 
 gi.require_version("AppStream", "1.0")
 
-from gi.repository import AppStream
+from gi.repository import AppStream, GLib
+from bakery import lp
+from bakery.search import TrigramIndex
 
-box = None
+# Where AppStream metadata may live, any change in them invalidates the cache
+metadata_dirs = [
+    "/usr/share/swcatalog",
+    "/var/lib/swcatalog",
+    "/var/cache/swcatalog",
+    "/usr/share/app-info",
+    "/var/lib/app-info",
+    "/var/cache/app-info",
+    "/usr/share/metainfo",
+    "/var/lib/flatpak/appstream",
+]
 
+_scanned_prefixes = tuple(d + "/" for d in metadata_dirs)
 
-def appstream_initialize() -> None:
-    global box
+CACHE_VERSION = 2
+
+index = None
+_loader = None
+
+_icons = {}  # component id -> icon path, None when it has none
+_icon_files = None
+_icon_lock = threading.Lock()
+
+
+class AppStreamIndex:
+    """
+    Columnar copy of the AppStream catalogue.
+
+    Component i is described by the i-th entry of every column, search goes
+    through a TrigramIndex over name, keywords and summary.
+    """
+
+    columns = ("ids", "names", "summaries", "keywords", "pkgnames", "origins", "icons")
+
+    def __init__(self) -> None:
+        for column in self.columns:
+            setattr(self, column, [])
+        self.search_index = TrigramIndex()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, info: dict) -> None:
+        i = len(self.ids)
+        keywords = " ".join(info["keywords"] or [])
+        self.ids.append(info["id"])
+        self.names.append(info["name"] or "")
+        self.summaries.append(info["description"] or "")
+        self.keywords.append(keywords)
+        self.pkgnames.append(info["package"])
+        self.origins.append(info["origin"])
+        self.icons.append(info["icon"])
+        self.search_index.add(i, info["name"], keywords, info["description"])
+
+    def info(self, i: int) -> dict:
+        """Component i in the form returned by get_appstream_app_info."""
+        return {
+            "name": self.names[i],
+            "id": self.ids[i],
+            "package": self.pkgnames[i],
+            "origin": self.origins[i],
+            "icon": resolve_icon(self.ids[i], self.icons[i]),
+            "description": self.summaries[i],
+            "keywords": self.keywords[i].split(),
+        }
+
+    def dump(self) -> dict:
+        data = {column: getattr(self, column) for column in self.columns}
+        data["search_index"] = self.search_index.dump()
+        return data
+
+    @classmethod
+    def load(cls, data: dict):
+        idx = cls()
+        for column in cls.columns:
+            setattr(idx, column, data[column])
+        idx.search_index = TrigramIndex.load(data["search_index"])
+        return idx
+
+
+def cache_path() -> str:
+    return os.path.join(GLib.get_user_cache_dir(), "bakery", "appstream.cache")
+
+
+def metadata_key() -> str:
+    """Hash of the path, mtime and size of every AppStream metadata file."""
+    h = hashlib.sha256(str(CACHE_VERSION).encode())
+    for base in metadata_dirs:
+        for root, dirs, files in os.walk(base, followlinks=True):
+            dirs[:] = sorted(d for d in dirs if d != "icons")
+            for name in sorted(files):
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                h.update(f"{root}/{name}:{st.st_mtime_ns}:{st.st_size};".encode())
+    return h.hexdigest()
+
+
+def load_cached_index(key: str):
+    try:
+        with open(cache_path(), "rb") as f:
+            data = marshal.load(f)
+        if data.get("key") == key:
+            return AppStreamIndex.load(data["index"])
+    except (OSError, EOFError, ValueError, TypeError, KeyError):
+        pass
+    return None
+
+
+def save_cached_index(key: str, idx: AppStreamIndex) -> None:
+    target = cache_path()
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + ".tmp", "wb") as f:
+            marshal.dump({"key": key, "index": idx.dump()}, f)
+        os.replace(target + ".tmp", target)
+    except (OSError, ValueError) as e:
+        lp(f"Could not write the AppStream cache: {e}", "warn")
+
+
+def build_index() -> AppStreamIndex:
     pool = AppStream.Pool()
     pool.load()
-    box = pool.get_components()
+    idx = AppStreamIndex()
+    for component in pool.get_components().as_array():
+        # Only components we know where to install from
+        if component.get_origin():
+            idx.add(get_appstream_app_info(component))
     pool.clear()
+    return idx
+
+
+def load_index() -> None:
+    global index
+    try:
+        key = metadata_key()
+        idx = load_cached_index(key)
+        if idx is None:
+            lp("Building AppStream index", "debug")
+            idx = build_index()
+            save_cached_index(key, idx)
+        index = idx
+        lp(f"AppStream index ready with {len(idx)} components", "debug")
+    except Exception as e:
+        lp(f"Could not load AppStream data: {e}", "warn")
+
+
+def appstream_initialize() -> None:
+    """Load the AppStream index in the background."""
+    global _loader
+    if _loader is None:
+        _loader = threading.Thread(target=load_index, daemon=True)
+        _loader.start()
 
 
 def search_appstream(query: str, limit: int = 25) -> list:
@@ -44,38 +194,66 @@ def search_appstream(query: str, limit: int = 25) -> list:
         limit (int): Maximum number of results to return
 
     Returns:
-        list: List of dictionaries containing app information
+        list: Dictionaries of app information, as get_appstream_app_info.
+    """
+    if index is None:
+        return []
+    return [index.info(i) for i in index.search_index.search(query, limit)]
+
+
+def appstream_icon_candidates(component) -> list:
+    """Icon files a component may ship, CACHED ones first, then LOCAL."""
+    cached = []
+    local = []
+    for icon in component.get_icons():
+        kind = icon.get_kind()
+        filename = icon.get_filename()
+        if not filename:
+            continue
+        if kind == AppStream.IconKind.CACHED:
+            cached.append(filename)
+        elif kind == AppStream.IconKind.LOCAL:
+            local.append(filename)
+    return cached + local
+
+
+def scan_icon_dirs() -> set:
+    """Every file below the AppStream icon cache directories."""
+    global _icon_files
+    with _icon_lock:
+        if _icon_files is None:
+            found = set()
+            for base in metadata_dirs:
+                for root, dirs, files in os.walk(base, followlinks=True):
+                    if "icons" in os.path.relpath(root, base).split(os.sep):
+                        found.update(os.path.join(root, name) for name in files)
+            _icon_files = found
+    return _icon_files
+
+
+def resolve_icon(component_id: str, candidates) -> str:
+    """
+    First existing icon file of a component, or None.
+
+    Results, missing icons included, are remembered per component id.
+    Files inside the icon caches are looked up in a single directory scan.
     """
-    results = []
-    for component in box.as_array():
-        name = component.get_name() or ""
-        description = component.get_summary() or ""
-        origin = component.get_origin() or ""
-        if (
-            query.lower() in name.lower() or query.lower() in description.lower()
-        ) and origin != "":
-            results.append(component)
-            if len(results) >= limit:
-                break
-    return results
-
-
-def appstream_get_icon(component):
-    icons = component.get_icons()
-    icon_path = None
-    icon_name = "N/A"
-    # Prefer CACHED icons, fallback to LOCAL
-    for icon in icons:
-        if (
-            icon.get_kind() == AppStream.IconKind.CACHED
-            or icon.get_kind() == AppStream.IconKind.LOCAL
-        ):
-            icon_path_candidate = icon.get_filename()
-            if icon_path_candidate and os.path.isfile(icon_path_candidate):
-                icon_path = icon_path_candidate
-                icon_name = icon.get_name() or os.path.basename(icon_path_candidate)
-
-    return icon_path if icon_path else "N/A", icon_name
+    try:
+        return _icons[component_id]
+    except KeyError:
+        pass
+    icon_files = scan_icon_dirs()
+    found = None
+    for candidate in candidates or []:
+        if candidate.startswith(_scanned_prefixes):
+            exists = candidate in icon_files
+        else:
+            exists = os.path.isfile(candidate)
+        if exists:
+            found = candidate
+            break
+    _icons[component_id] = found
+    return found
 
 
 def get_appstream_app_info(component) -> dict:
@@ -87,7 +265,7 @@ def get_appstream_app_info(component) -> dict:
         "id": component.get_id(),
         "package": component.get_pkgname(),
         "origin": component.get_origin(),
-        "icon": appstream_get_icon(component),
+        "icon": appstream_icon_candidates(component),
         "description": component.get_summary(),
         "keywords": component.get_keywords(),
     }
@@ -22,6 +22,9 @@ supported_languages = {"English": "en_US.UTF-8"}
 timezone = {"region": "Europe", "zone": "London"}
 installer_version = "1.3.2"
 api_version = 1
+# Apply locale, keymap, timezone and hostname of from_iso installs in a
+# single systemd-firstboot pass instead of one step each. Optional.
+use_firstboot = False
 
 
 def pages(_):
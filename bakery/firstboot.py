@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# Copyright 2025 BredOS
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import os
+import shutil
+from bredos.utilities import catch_exceptions
+from bakery import lrun, lp, dryrun
+from .keyboard import console_keymap, kb_validate, write_xorg_keyboard
+from .locale import locales
+from .timezone import tz_index
+
+
+def _write(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+@catch_exceptions
+def firstboot(
+    locale: str, layout: dict, timezone: dict, hostname: str, mnt_dir: str
+) -> None:
+    """
+    Apply locale, keymap, timezone and hostname to mnt_dir in one pass.
+
+    Uses a single systemd-firstboot --root run when available, writing the
+    same files directly otherwise. The Xorg keyboard snippet is written
+    alongside, vconsole.conf gets the console keymap matching the layout.
+    """
+    if locale not in locales(True, True, mnt_dir):
+        if dryrun:
+            lp("The locale " + locale + " is not enabled, but this is a dryrun.")
+        else:
+            raise OSError("Locale " + locale + " not enabled!")
+    kb_validate(layout["model"], layout["layout"], layout["variant"])
+    tz = timezone["region"] + "/" + timezone["zone"]
+    if tz not in tz_index(True, mnt_dir).names:
+        lp("Timezone " + tz + " not a valid timezone!")
+        raise TypeError("Timezone " + tz + " not a valid timezone!")
+
+    lang = locale.split(" ")[0]
+    keymap = console_keymap(layout["layout"], layout["variant"], mnt_dir)
+    lp(
+        "Configuring "
+        + mnt_dir
+        + ": LANG="
+        + lang
+        + ", keymap "
+        + keymap
+        + ", timezone "
+        + tz
+        + ", hostname "
+        + hostname
+    )
+    if shutil.which("systemd-firstboot"):
+        lrun(
+            [
+                "systemd-firstboot",
+                "--root=" + mnt_dir,
+                "--force",
+                "--locale=" + lang,
+                "--keymap=" + keymap,
+                "--timezone=" + tz,
+                "--hostname=" + hostname,
+            ]
+        )
+    elif dryrun:
+        lp("Would have written locale.conf, vconsole.conf, localtime and hostname")
+    else:
+        _write(mnt_dir + "/etc/locale.conf", "LANG=" + lang + "\n")
+        _write(mnt_dir + "/etc/vconsole.conf", "KEYMAP=" + keymap + "\n")
+        _write(mnt_dir + "/etc/hostname", hostname + "\n")
+        localtime = mnt_dir + "/etc/localtime"
+        if os.path.lexists(localtime):
+            os.remove(localtime)
+        os.symlink("../usr/share/zoneinfo/" + tz, localtime)
+
+    if dryrun:
+        lp("Would have written the Xorg keyboard configuration")
+    else:
+        write_xorg_keyboard(
+            layout["model"], layout["layout"], layout["variant"], mnt_dir
+        )
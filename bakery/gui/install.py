@@ -19,15 +19,18 @@
 
 from bakery import lp, lrun, _, st_msgs
 from pyrunning import LoggingLevel
-from bakery.install import install
 from bredos.utilities import time_fn
 import threading
+from collections import deque
 import gi
 
 gi.require_version("Gtk", "4.0")
 gi.require_version("Adw", "1")
 from gi.repository import Gtk, Adw, GLib  # type: ignore
 
+CONSOLE_FLUSH_INTERVAL = 16  # ms, about one frame
+MAX_CONSOLE_LINES = 5000
+
 
 @time_fn
 @Gtk.Template(resource_path="/org/bredos/bakery/ui/install_screen.ui")
@@ -43,7 +46,9 @@ class install_screen(Adw.Bin):
         super().__init__(**kwargs)
         self.window = window
         self.console_buffer = self.console_text_view.get_buffer()
-        self.console_buffer.connect("changed", self.on_text_buffer_changed)
+        self.console_end = self.console_buffer.create_mark(
+            None, self.console_buffer.get_end_iter(), False
+        )
 
         self.colors = {
             "CRITICAL": "#a40000",
@@ -56,11 +61,13 @@ class install_screen(Adw.Bin):
             "": "#808080",
             None: "#808080",
         }
+        for level, color in self.colors.items():
+            if level:
+                self.console_buffer.create_tag(level, foreground=color)
 
-    def on_text_buffer_changed(self, buffer):
-        # Scroll to the end of the text buffer
-        adj = self.console.get_vadjustment()
-        adj.set_value(adj.get_upper() - adj.get_page_size())
+        # Filled from any thread, drained on the main loop by flush_console
+        self.log_queue = deque()
+        self._flush_pending = False
 
     def console_logging(
         self,
@@ -78,52 +85,43 @@ class install_screen(Adw.Bin):
         pos = message.find("%ST")
         if pos != -1:
             prs = message.rfind("%")
-            stm = st_msgs[int(message[pos + 3 : prs])]
-            self.progress_bar.set_fraction(stm[1] / 100)
-            self.curr_action.set_label(stm[0])
+            self.log_queue.append((None, st_msgs[int(message[pos + 3 : prs])]))
         else:
-            GLib.idle_add(
-                lambda: (
-                    self.console_buffer.insert_markup(
-                        self.console_buffer.get_end_iter(),
-                        "".join(
-                            (
-                                "- ",
-                                '<span color="{:s}">',
-                                logging_level_name.rjust(8, " "),
-                                ": ",
-                                "</span>",
-                            )
-                        ).format(self.colors[logging_level_name]),
-                        -1,
-                    )
-                )
-            )
-
-            if LoggingLevel(logging_level) != LoggingLevel.DEBUG:
-                GLib.idle_add(
-                    lambda: (
-                        self.console_buffer.insert(
-                            self.console_buffer.get_end_iter(), "".join((message, "\n"))
-                        )
-                    )
-                )
+            self.log_queue.append((logging_level_name, message))
+
+        if not self._flush_pending:
+            self._flush_pending = True
+            GLib.timeout_add(CONSOLE_FLUSH_INTERVAL, self.flush_console)
+
+    def flush_console(self):
+        """Insert all queued log lines at once and keep the console bounded"""
+        # Reset before draining, so lines queued from now on get a new flush
+        self._flush_pending = False
+        buf = self.console_buffer
+        end = buf.get_end_iter()
+        stage = None
+        while self.log_queue:
+            level, message = self.log_queue.popleft()
+            if level is None:
+                stage = message
+                continue
+            tag = level if level in self.colors else "NOTSET"
+            buf.insert_with_tags_by_name(end, "- " + level.rjust(8, " ") + ": ", tag)
+            if level == "DEBUG":
+                buf.insert_with_tags_by_name(end, message + "\n", tag)
             else:
-                GLib.idle_add(
-                    lambda: (
-                        self.console_buffer.insert_markup(
-                            self.console_buffer.get_end_iter(),
-                            "".join(
-                                (
-                                    '<span color="{:s}">',
-                                    GLib.markup_escape_text(message),
-                                    "</span>" "\n",
-                                )
-                            ).format(self.colors[logging_level_name]),
-                            -1,
-                        )
-                    )
-                )
+                buf.insert(end, message + "\n")
+
+        excess = buf.get_line_count() - MAX_CONSOLE_LINES
+        if excess > 0:
+            start = buf.get_start_iter()
+            buf.delete(start, buf.get_iter_at_line(excess)[1])
+
+        if stage is not None:
+            self.progress_bar.set_fraction(stage[1] / 100)
+            self.curr_action.set_label(stage[0])
+        self.console_text_view.scroll_mark_onscreen(self.console_end)
+        return False  # Stop timeout_add
 
 
 class InstallThread(threading.Thread):
@@ -138,13 +136,14 @@ class InstallThread(threading.Thread):
             "Starting install with data: "
             + str(self.window.collect_data(show_pass=False))
         )
+        from bakery.install import install
+
         res = install(install_data)
         if res == 0:
             # Change to finish page
             self.window.current_page = self.window.pages.index("Finish")
             page_name = self.window.pages[self.window.current_page]
-            page_id = self.window.get_page_id(page_name)
-            self.window.stack1.set_visible_child_name(page_id)
+            GLib.idle_add(self.window.show_page, page_name)
             self.window.button_box.set_visible(True)
             self.window.button_box.set_halign(Gtk.Align.END)
             self.window.back_btn.set_visible(False)
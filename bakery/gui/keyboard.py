@@ -28,6 +28,16 @@ gi.require_version("Adw", "1")
 from gi.repository import Gtk, Adw  # type: ignore
 
 
+def prefetch() -> dict:
+    """Layout and model lists for kb_screen, safe to run in a thread."""
+    return {
+        "prettylayouts": kb_layouts(True),
+        "prettymodels": kb_models(True),
+        "layouts": kb_layouts(),
+        "models": kb_models(),
+    }
+
+
 @time_fn
 @Gtk.Template(resource_path="/org/bredos/bakery/ui/kb_screen.ui")
 class kb_screen(Adw.Bin):
@@ -41,13 +51,14 @@ class kb_screen(Adw.Bin):
     variant_list = Gtk.Template.Child()  # GtkListBox
     select_variant_btn = Gtk.Template.Child()
 
-    def __init__(self, window, **kwargs) -> None:
+    def __init__(self, window, prefetched=None, **kwargs) -> None:
         super().__init__(**kwargs)
         self.window = window
-        self.kb_prettylayouts = {k: v for k, v in sorted(kb_layouts(True).items())}
-        self.kb_prettymodels = kb_models(True)
-        self.kb_layouts = kb_layouts()
-        self.kb_models = kb_models()
+        data = prefetched or prefetch()
+        self.kb_prettylayouts = {k: v for k, v in sorted(data["prettylayouts"].items())}
+        self.kb_prettymodels = data["prettymodels"]
+        self.kb_layouts = data["layouts"]
+        self.kb_models = data["models"]
 
         self.layout = {"model": "pc105", "layout": None, "variant": None}
 
@@ -85,7 +96,7 @@ class kb_screen(Adw.Bin):
             self.last_selected_row = None
 
             # preselect the American English layout
-            if lang == "American English":
+            if lang == self.kb_layouts.get("us"):
                 self.langs_list.select_row(row)
                 self.last_selected_row = row
                 self.layout["layout"] = "us"
@@ -17,10 +17,8 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from bakery import lp, lrun, _
+from bakery import lp, lrun, _, lazy_import
 from bakery.locale import langs
-from babel import dates, numbers
-from babel import Locale as bLocale
 from datetime import datetime, UTC
 from bredos.utilities import time_fn
 
@@ -32,6 +30,16 @@ gi.require_version("Adw", "1")
 from gi.repository import Gtk, Adw  # type: ignore
 
 
+babel = lazy_import("babel")
+dates = lazy_import("babel.dates")
+numbers = lazy_import("babel.numbers")
+
+
+def prefetch() -> dict:
+    """Language list for locale_screen, safe to run in a thread."""
+    return {"langs": langs()}
+
+
 @time_fn
 @Gtk.Template(resource_path="/org/bredos/bakery/ui/locale_screen.ui")
 class locale_screen(Adw.Bin):
@@ -45,10 +53,11 @@ class locale_screen(Adw.Bin):
     locales_list = Gtk.Template.Child()
     select_locale_btn = Gtk.Template.Child()
 
-    def __init__(self, window, **kwargs) -> None:
+    def __init__(self, window, prefetched=None, **kwargs) -> None:
         super().__init__(**kwargs)
         self.window = window
-        self.lang_data = {k: v for k, v in sorted(langs().items())}
+        data = prefetched or prefetch()
+        self.lang_data = {k: v for k, v in sorted(data["langs"].items())}
 
         self.locale_dialog.set_transient_for(self.window)
         self.locale_dialog.set_modal(self.window)
@@ -108,7 +117,7 @@ class locale_screen(Adw.Bin):
         except ValueError:
             the_locale = selected_locale
         self.locale = selected_locale
-        locale_ = bLocale.parse(the_locale)
+        locale_ = babel.Locale.parse(the_locale)
         date = dates.format_date(date=datetime.now(UTC), format="full", locale=locale_)
         time = dates.format_time(time=datetime.now(UTC), format="long", locale=locale_)
         currency = numbers.get_territory_currencies(locale_.territory)[0]
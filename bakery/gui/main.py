@@ -18,7 +18,7 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import threading
-from time import sleep
+from importlib import import_module
 
 from bakery import config, lp, lrun, _, log_file
 from bakery.misc import upload_log, reboot, detect_install_source
@@ -36,16 +36,37 @@ gi.require_version("Gtk", "4.0")
 gi.require_version("Adw", "1")
 from gi.repository import Gtk, Adw, Gio, Gdk, GLib  # type: ignore
 
-from .desktops import de_screen
-from .finish import finish_screen
-from .install import InstallThread, install_screen
-from .keyboard import kb_screen
-from .timezone import timezone_screen
-from .locale import locale_screen
-from .user import user_screen
-from .partitioning import partitioning_screen
-from .packages import packages_screen
-from .summary import summary_screen
+# Module of each page's screen, imported when the page is first needed.
+# A module level prefetch() loads the slow data of a page in a thread.
+page_modules = {
+    "Keyboard": ".keyboard",
+    "Locale": ".locale",
+    "Timezone": ".timezone",
+    "User": ".user",
+    "Desktops": ".desktops",
+    "Packages": ".packages",
+    "Partitioning": ".partitioning",
+    "Summary": ".summary",
+    "Install": ".install",
+    "Finish": ".finish",
+}
+
+
+def page_module(page):
+    return import_module(page_modules[page], __package__)
+
+
+class LazyPages(dict):
+    """Page name -> screen, screens are built on first access."""
+
+    def __init__(self, build) -> None:
+        super().__init__()
+        self.build = build
+
+    def __missing__(self, page):
+        screen = self.build(page)
+        self[page] = screen
+        return screen
 
 
 class BakeryApp(Adw.Application):
@@ -268,12 +289,13 @@ class BakeryWindow(Adw.ApplicationWindow):
     def start_install(self) -> None:
         self.current_page = self.pages.index("Install")
         page_name = self.pages[self.current_page]
-        page_id = self.get_page_id(page_name)
         self.set_deletable(False)
         self.disconnect(self._close_request_handler_id)
-        self.stack1.set_visible_child_name(page_id)
+        self.show_page(page_name)
         self.button_box.set_visible(False)
-        self.install_thread = InstallThread(self, all_pages["Install"])
+        self.install_thread = page_module("Install").InstallThread(
+            self, all_pages["Install"]
+        )
         self.install_thread.start()
 
     def on_install_dialog_response(self, dialog, resp) -> None:
@@ -298,12 +320,10 @@ class BakeryWindow(Adw.ApplicationWindow):
                 self.next_btn.connect("clicked", self.on_install_btn_clicked)
                 self.update_buttons()
                 page_name = self.pages[self.current_page]
-                page_id = self.get_page_id(page_name)
-                self.stack1.set_visible_child_name(page_id)
+                self.show_page(page_name)
             else:
                 page_name = self.pages[self.current_page]
-                page_id = self.get_page_id(page_name)
-                self.stack1.set_visible_child_name(page_id)
+                self.show_page(page_name)
                 self.update_buttons()
 
             # Update step indicators after page change
@@ -313,8 +333,7 @@ class BakeryWindow(Adw.ApplicationWindow):
         if self.current_page > 0:
             self.current_page -= 1
             page_name = self.pages[self.current_page]
-            page_id = self.get_page_id(page_name)
-            self.stack1.set_visible_child_name(page_id)
+            self.show_page(page_name)
             try:
                 self.next_btn.disconnect_by_func(self.on_install_btn_clicked)
                 self.next_btn.connect("clicked", self.on_next_clicked)
@@ -328,28 +347,16 @@ class BakeryWindow(Adw.ApplicationWindow):
     def update_buttons(self) -> None:
         num_pages = len(self.pages)
         # if page is user page make it so user cant go forward
-        global user_event
-        global part_event
-        user_event = threading.Event()
-        part_event = threading.Event()
-        self.check_thread = CheckThread(all_pages["User"])
-
         if self.install_source == "from_iso":
-            self.check_part_thread = CheckPartitioningThread(all_pages["Partitioning"])
-
             if self.current_page == self.pages.index("User"):
-                self.next_btn.set_sensitive(False)
-                # start the thread to check when all fields are filled
+                # only allow going forward once all fields are filled
                 self.next_btn.set_label(_("Next"))  # pyright: ignore[reportCallIssue]
-                self.check_thread.start()
+                self.next_btn.set_sensitive(all_pages["User"].is_valid())
             elif self.current_page == self.pages.index("Partitioning"):
-                user_event.set()
-                self.next_btn.set_sensitive(False)
-                # start the thread to check when all fields are filled
+                # only allow going forward once the selection is usable
                 self.next_btn.set_label(_("Next"))  # pyright: ignore[reportCallIssue]
-                self.check_part_thread.start()
+                self.next_btn.set_sensitive(all_pages["Partitioning"].is_valid())
             elif self.current_page == self.pages.index("Summary"):
-                user_event.set()
                 all_pages["Summary"].page_shown()
                 # change the next button to install
                 self.next_btn.set_label(
@@ -362,18 +369,14 @@ class BakeryWindow(Adw.ApplicationWindow):
                 self.next_btn.set_sensitive(False)
             else:
                 self.next_btn.set_label(_("Next"))  # pyright: ignore[reportCallIssue]
-                user_event.set()
-                part_event.set()
                 self.next_btn.set_sensitive(self.current_page < num_pages - 1)
                 self.back_btn.set_sensitive(self.current_page > 0)
         else:
             if self.current_page == self.pages.index("User"):
-                self.next_btn.set_sensitive(False)
-                # start the thread to check when all fields are filled
+                # only allow going forward once all fields are filled
                 self.next_btn.set_label(_("Next"))  # pyright: ignore[reportCallIssue]
-                self.check_thread.start()
+                self.next_btn.set_sensitive(all_pages["User"].is_valid())
             elif self.current_page == self.pages.index("Summary"):
-                user_event.set()
                 all_pages["Summary"].page_shown()
                 # change the next button to install
                 self.next_btn.set_label(
@@ -386,11 +389,21 @@ class BakeryWindow(Adw.ApplicationWindow):
                 self.next_btn.set_sensitive(False)
             else:
                 self.next_btn.set_label(_("Next"))  # pyright: ignore[reportCallIssue]
-                user_event.set()
-                part_event.set()
                 self.next_btn.set_sensitive(self.current_page < num_pages - 1)
                 self.back_btn.set_sensitive(self.current_page > 0)
 
+    def selected_locale(self) -> str | None:
+        """The locale picked on the Locale page, if it was visited."""
+        if "Locale" not in all_pages:
+            return None
+        return getattr(all_pages["Locale"], "locale", None)
+
+    def validity_changed(self, page) -> None:
+        """Called by pages gating the next button whenever their input changes."""
+        current = self.pages[self.current_page]
+        if all_pages.get(current) is page:
+            self.next_btn.set_sensitive(page.is_valid())
+
     def on_cancel_clicked(self, button) -> None:
         # connect the yes button to the delete_pages function
         self.cancel_dialog.present()
@@ -434,13 +447,20 @@ class BakeryWindow(Adw.ApplicationWindow):
             data["install_type"] = install_data
             data["session_configuration"] = self.session_configuration
             data["root_password"] = False
-            data["layout"] = all_pages["Keyboard"].layout
-            data["locale"] = all_pages["Locale"].locale
-            data["timezone"] = all_pages["Timezone"].timezone
-            data["hostname"] = all_pages["User"].get_hostname()
-            data["user"] = all_pages["User"].collect_data()
-            if not show_pass:
-                data["user"]["password"] = "REDACTED"
+            # Only pages that were built, looking one up in all_pages
+            # would build it just to read its defaults.
+            page = all_pages.get
+            if page("Keyboard") is not None:
+                data["layout"] = page("Keyboard").layout
+            if page("Locale") is not None:
+                data["locale"] = page("Locale").locale
+            if page("Timezone") is not None:
+                data["timezone"] = page("Timezone").timezone
+            if page("User") is not None:
+                data["hostname"] = page("User").get_hostname()
+                data["user"] = page("User").collect_data()
+                if not show_pass:
+                    data["user"]["password"] = "REDACTED"
             installer = {}
             installer["installer_version"] = config.installer_version
             installer["ui"] = "gui"
@@ -450,14 +470,16 @@ class BakeryWindow(Adw.ApplicationWindow):
             if self.install_source == "from_iso":
                 data["packages"]["to_remove"] = config.iso_packages_to_remove
             try:
-                data["partitions"] = all_pages["Partitioning"].collect_data()
+                data["partitions"] = page("Partitioning").collect_data()
             except:
                 data["partitions"] = []
             if self.install_type == "online":
-                data["packages"]["extra_to_install"] = all_pages[
-                    "Packages"
-                ].collect_data()
-                data["packages"]["desktop"] = all_pages["Desktops"].collect_data()
+                if page("Packages") is not None:
+                    data["packages"]["extra_to_install"] = page(
+                        "Packages"
+                    ).collect_data()
+                if page("Desktops") is not None:
+                    data["packages"]["desktop"] = page("Desktops").collect_data()
 
             return data
         else:
@@ -471,13 +493,61 @@ class BakeryWindow(Adw.ApplicationWindow):
             list.append(string)
 
     def add_pages(self, stack, pages) -> None:
+        """
+        Add a placeholder for every page, screens are built by build_page
+        the first time they are needed.
+        """
         global all_pages, pages_dict
-        all_pages = {}
+        all_pages = LazyPages(self.build_page)
         pages_dict = config.pages(_)
+        self.page_bins = {}
+        self.prefetching = {}
         for page in pages:
-            page_ = globals()[pages_dict[page][0]](window=self)
-            all_pages[page] = page_
-            stack.add_titled(page_, page, pages_dict[page][1])
+            self.page_bins[page] = Adw.Bin()
+            stack.add_titled(self.page_bins[page], page, pages_dict[page][1])
+
+    @time_fn
+    def build_page(self, page):
+        module = page_module(page)
+        kwargs = {}
+        if hasattr(module, "prefetch"):
+            kwargs["prefetched"] = None
+            if page in self.prefetching:
+                thread, result = self.prefetching.pop(page)
+                thread.join()
+                kwargs["prefetched"] = result.get("data")
+        page_ = getattr(module, pages_dict[page][0])(window=self, **kwargs)
+        self.page_bins[page].set_child(page_)
+        return page_
+
+    def prefetch_page(self, index) -> None:
+        """Load the data of the page at index in the background."""
+        if index >= len(self.pages):
+            return
+        page = self.pages[index]
+        if page in all_pages or page in self.prefetching:
+            return
+        # Imported here, GTK types must be registered on the main thread
+        prefetch = getattr(page_module(page), "prefetch", None)
+        if prefetch is None:
+            return
+        result = {}
+
+        def run():
+            try:
+                result["data"] = prefetch()
+            except Exception as e:
+                lp(f"Prefetching {page} failed: {e}", mode="warn")
+
+        thread = threading.Thread(target=run, daemon=True)
+        self.prefetching[page] = (thread, result)
+        thread.start()
+
+    def show_page(self, page_name) -> bool:
+        all_pages[page_name]  # Build it if this is the first visit
+        self.stack1.set_visible_child_name(self.get_page_id(page_name))
+        self.prefetch_page(self.pages.index(page_name) + 1)
+        return False  # Stop idle_add
 
     def create_step_indicators(self):
         """Create circular step indicators with page names above and horizontal lines between circles using overlays"""
@@ -602,47 +672,10 @@ class BakeryWindow(Adw.ApplicationWindow):
         setup_handler(all_pages["Install"].console_logging)
         self.install_type = install_type
         self.current_page = 0
+        self.show_page(self.pages[0])
 
         # Create step indicators after pages are determined
         self.create_step_indicators()
 
         self.update_buttons()
         self.main_stk.set_visible_child(self.install_page.get_child())
-
-
-class CheckThread(threading.Thread):
-    def __init__(self, window):
-        threading.Thread.__init__(self)
-        self.window = window
-
-    def run(self):
-        while True:
-            if user_event.is_set():
-                break
-            if (
-                (self.window.get_username() is not None)
-                and (self.window.get_hostname() is not None)
-                and (self.window.get_password() is not None)
-                and (self.window.get_fullname() is not None)
-                and (self.window.validate_uid(self.window.uid_row) is not None)
-            ):
-                win.next_btn.set_sensitive(True)
-            else:
-                win.next_btn.set_sensitive(False)
-            sleep(0.3)
-
-
-class CheckPartitioningThread(threading.Thread):
-    def __init__(self, window):
-        threading.Thread.__init__(self)
-        self.window = window
-
-    def run(self):
-        while True:
-            if part_event.is_set():
-                break
-            if self.window.validate_selection():
-                win.next_btn.set_sensitive(True)
-            else:
-                win.next_btn.set_sensitive(False)
-            sleep(0.3)
@@ -18,22 +18,73 @@
 # SPDX-License-Identifier: GPL-3.0-or-later
 
 import platform
+import threading
+from collections import OrderedDict
 import gi
 
-from os import path
 from bakery import lp, lrun, _
-from bakery.appstream import (
-    appstream_initialize,
-    search_appstream,
-    get_appstream_app_info,
-)
+from bakery.appstream import appstream_initialize, search_appstream
 from bakery.gui.helper import set_margins
 from bakery.packages import get_packages_list
+from bakery.pkgtree import PACKAGE, PackageTree, Selection
+from bakery.search import TrigramIndex
 from bredos.utilities import time_fn
 
 gi.require_version("Gtk", "4.0")
 gi.require_version("Adw", "1")
-from gi.repository import Gtk, Adw, GLib, Pango  # type: ignore
+from gi.repository import Gtk, Gdk, Gio, GLib, GObject, Pango  # type: ignore
+
+SEARCH_DELAY = 150  # ms of typing inactivity before searching
+TEXTURE_CACHE_SIZE = 256
+
+_textures = OrderedDict()  # icon path -> Gdk.Texture, None if unloadable
+
+
+def icon_texture(icon_path: str):
+    """Decoded icon, kept in a bounded LRU so rows render without disk I/O"""
+    try:
+        _textures.move_to_end(icon_path)
+        return _textures[icon_path]
+    except KeyError:
+        pass
+    try:
+        texture = Gdk.Texture.new_from_filename(icon_path)
+    except GLib.Error:
+        texture = None
+    _textures[icon_path] = texture
+    if len(_textures) > TEXTURE_CACHE_SIZE:
+        _textures.popitem(last=False)
+    return texture
+
+
+class PackageItem(GObject.GObject):
+    name = GObject.Property(type=str, default="")
+    description = GObject.Property(type=str, default="")
+    icon = GObject.Property(type=str, default="")
+    key = GObject.Property(type=str, default="")
+    immutable = GObject.Property(type=bool, default=False)
+    entry = None  # package tree node, or AppStream result dict
+
+
+def build_search_index(tree) -> TrigramIndex:
+    """Index group and package names and descriptions, names rank first"""
+    search_index = TrigramIndex()
+    for i in range(len(tree)):
+        if tree.arch_ok[i]:
+            search_index.add(i, tree.name[i], tree.attr(i, "description"))
+    return search_index
+
+
+def prefetch() -> dict:
+    """Package tree and its search index, safe to run in a thread."""
+    appstream_initialize()
+    packages = get_packages_list()
+    tree = PackageTree(packages, platform.machine())
+    return {
+        "packages": packages,
+        "tree": tree,
+        "search_index": build_search_index(tree),
+    }
 
 
 @time_fn
@@ -42,53 +93,34 @@ class packages_screen(Gtk.Box):
     __gtype_name__ = "packages_screen"
     packages_box = Gtk.Template.Child()
 
-    def __init__(self, window, **kwargs) -> None:
+    def __init__(self, window, prefetched=None, **kwargs) -> None:
         super().__init__(**kwargs)
         self.window = window
 
         # Get current architecture
         self.current_arch = platform.machine()
 
-        # Load packages data
-        self.packages = get_packages_list()
+        # Load packages data, also starts loading AppStream
+        data = prefetched or prefetch()
+        self.packages = data["packages"]
+        self.tree = data["tree"]
+        self.search_index = data["search_index"]
 
         # State tracking
-        self.selection_state = {}  # key -> bool (selected state)
-        self.checkboxes = {}  # key -> Gtk.CheckButton
-        self.group_hierarchy = (
-            {}
-        )  # group_key -> {"packages": [pkg_keys], "subgroups": [grp_keys]}
-        self.parent_map = {}  # child_key -> parent_key
+        # Tree packages as a bitset, AppStream results in selection.extra
+        self.selection = Selection(self.tree)
+        self.checkboxes = {}  # pkg_key -> Gtk.CheckButton of the bound rows
         self._updating = False  # prevent signal loops during programmatic updates
-
-        # Package tracking
-        self.package_metadata = {}  # pkg_key -> {"name": str, "post_install": str}
-        self.group_metadata = {}  # grp_key -> {"post_install": str}
+        self._refresh_pending = False
+        self._search_gen = 0  # bumped on every keystroke, stale results are dropped
+        self._search_timeout = 0
 
         # UI state
         self.current_category = None
-        self.filtered_packages = []
+        self.category_desc_label = None
 
-        # Select all default packages before building UI
-        self.select_all_default_packages()
         # Build and show UI
         self.build_ui()
-        GLib.idle_add(appstream_initialize)
-
-    def escape_html(self, s, quote=True):
-        """
-        Replace special characters "&", "<" and ">" to HTML-safe sequences.
-        If the optional flag quote is true (the default), the quotation mark
-        characters, both double quote (") and single quote (') characters are also
-        translated.
-        """
-        s = s.replace("&", "&amp;")  # Must be done first!
-        s = s.replace("<", "&lt;")
-        s = s.replace(">", "&gt;")
-        if quote:
-            s = s.replace('"', "&quot;")
-            s = s.replace("'", "&#x27;")
-        return s
 
     def build_categories_panel(self):
         """Build and return the left panel with categories and search"""
@@ -113,11 +145,19 @@ class packages_screen(Gtk.Box):
         reset_btn.connect("clicked", self.on_default_selections)
         header_row.append(reset_btn)
 
+        self.undo_btn = Gtk.Button.new_from_icon_name("edit-undo-symbolic")
+        self.undo_btn.set_valign(Gtk.Align.CENTER)
+        self.undo_btn.set_tooltip_text("Undo last selection change")
+        self.undo_btn.set_sensitive(False)
+        self.undo_btn.connect("clicked", self.on_undo)
+        header_row.append(self.undo_btn)
+
         left_box.append(header_row)
 
         # Search entry
         self.search_entry = Gtk.SearchEntry.new()
         self.search_entry.set_placeholder_text("Search applications and categories...")
+        self.search_entry.set_search_delay(0)  # debounced in on_search_changed
         self.search_entry.connect("search-changed", self.on_search_changed)
         left_box.append(self.search_entry)
 
@@ -153,63 +193,83 @@ class packages_screen(Gtk.Box):
         self.applications_label.add_css_class("title-2")
         right_box.append(self.applications_label)
 
-        # Applications description (dimmed)
-        self.category_desc_label = None  # Initialize here
         # Applications list in scrolled window
         apps_scrolled = Gtk.ScrolledWindow()
         apps_scrolled.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
         apps_scrolled.set_vexpand(True)
         right_box.append(apps_scrolled)
 
-        # Applications list box
-        self.applications_list = Gtk.ListBox.new()
-        self.applications_list.set_selection_mode(Gtk.SelectionMode.NONE)
-        self.applications_list.add_css_class("boxed-list")
-        self.applications_list.set_valign(Gtk.Align.START)
+        # Applications list, only the visible rows are realized
+        self.app_store = Gio.ListStore(item_type=PackageItem)
+        factory = Gtk.SignalListItemFactory()
+        factory.connect("setup", self.on_app_setup)
+        factory.connect("bind", self.on_app_bind)
+        factory.connect("unbind", self.on_app_unbind)
+        self.applications_list = Gtk.ListView(
+            model=Gtk.NoSelection(model=self.app_store), factory=factory
+        )
+        self.applications_list.add_css_class("rich-list")
+        self.applications_list.connect("activate", self.on_app_activated)
         apps_scrolled.set_child(self.applications_list)
 
         return right_box
 
     def populate_categories(self):
         """Populate the categories list"""
-        self.show_selected_applications_category()
-        groups = self.packages if isinstance(self.packages, list) else [self.packages]
-        for grp_data in groups:
-            if self.is_valid_group(grp_data) and self.is_arch_compatible(grp_data):
-                self.add_category_row(grp_data, [])
-
-    def add_category_row(self, group_data, parent_path, depth=0):
-        """Add a category row to the categories list"""
-        name = group_data.get("name", "Unnamed")
-        current_path = parent_path + [name]
-        group_key = self.make_group_key(current_path)
+        self.categories_list.append(
+            self.make_special_row(
+                "grp:selected", "Selected Applications", "emblem-ok-symbolic"
+            )
+        )
+        for node in self.tree.roots:
+            if self.tree.arch_ok[node]:
+                self.categories_list.append(self.make_category_row(node, 0))
 
+    def make_special_row(self, group_key, title, icon_name):
+        """Create a row for a category that is not part of the package tree"""
         row = Gtk.ListBoxRow.new()
-        row.group_data = group_data
+        row.node = None
         row.group_key = group_key
+        row.depth = 0
+        row.entries = []
+        row_box = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, spacing=8)
+        set_margins(row_box, 8, 8, 8, 8)
+        icon = Gtk.Image.new_from_icon_name(icon_name)
+        icon.set_icon_size(Gtk.IconSize.NORMAL)
+        row_box.append(icon)
+        label = Gtk.Label.new(title)
+        label.set_halign(Gtk.Align.START)
+        label.set_hexpand(True)
+        row_box.append(label)
+        row.set_child(row_box)
+        return row
+
+    def make_category_row(self, node, depth):
+        """Create a category row for a group of the package tree"""
+        row = Gtk.ListBoxRow.new()
+        row.node = node
+        row.group_key = self.tree.key[node]
         row.depth = depth
+        row.has_subgroups = False
+        row.expanded = False
 
         row_box = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, spacing=8)
         set_margins(row_box, 8 + (depth * 16), 8, 8, 8)
 
-        icon_name = group_data.get("icon")
+        icon_name = self.tree.attr(node, "icon")
         if icon_name:
             icon = Gtk.Image.new_from_icon_name(icon_name)
             icon.set_icon_size(Gtk.IconSize.NORMAL)
             row_box.append(icon)
 
-        title_label = Gtk.Label.new(name)
+        title_label = Gtk.Label.new(self.tree.name[node])
         title_label.set_wrap(True)
         title_label.set_max_width_chars(24)
         title_label.set_ellipsize(Pango.EllipsizeMode.NONE)
         row_box.append(title_label)
 
         # Show expand arrow as a flat button if this group/subgroup has subgroups
-        subgroups = group_data.get("subgroups", [])
-        has_subgroups = any(
-            self.is_valid_group(sg) and self.is_arch_compatible(sg) for sg in subgroups
-        )
-        if has_subgroups:
+        if self.tree.subgroups(node):
             arrow_icon = Gtk.Image.new_from_icon_name("go-next-symbolic")
             arrow_icon.set_icon_size(Gtk.IconSize.NORMAL)
             arrow_btn = Gtk.Button.new()
@@ -218,255 +278,121 @@ class packages_screen(Gtk.Box):
             arrow_btn.set_focusable(False)
             row_box.append(arrow_btn)
             row.has_subgroups = True
-            row.expanded = False
+            row.arrow_icon = arrow_icon
 
-            def on_arrow_clicked(
-                btn, row=row, group_data=group_data, depth=depth, arrow_icon=arrow_icon
-            ):
-                if getattr(row, "expanded", False):
+            def on_arrow_clicked(btn, row=row):
+                if row.expanded:
                     self.collapse_category(row)
-                    arrow_icon.set_from_icon_name("go-next-symbolic")
                 else:
-                    self.expand_category(row, group_data, depth)
-                    arrow_icon.set_from_icon_name("go-down-symbolic")
+                    self.expand_category(row)
 
             arrow_btn.connect("clicked", on_arrow_clicked)
 
         row.set_child(row_box)
-        self.categories_list.append(row)
-
-        self.group_hierarchy[group_key] = {"packages": [], "subgroups": []}
-
-        packages = group_data.get("packages", [])
-        for pkg_data in packages:
-            if self.is_valid_package(pkg_data) and self.is_arch_compatible(pkg_data):
-                self.create_package_key(pkg_data, current_path, group_key)
-
-    def create_package_key(self, pkg_data, parent_path, group_key):
-        """Create package key and store metadata"""
-        if isinstance(pkg_data, str):
-            name = pkg_data
-            post_install = None
-        else:
-            name = pkg_data.get("name", "")
-            post_install = pkg_data.get("post-install")
-
-        pkg_key = self.make_package_key(parent_path, name)
-
-        # Store package metadata
-        self.package_metadata[pkg_key] = {
-            "name": name,
-            "post_install": post_install,
-            "data": pkg_data,
-        }
-
-        # Add to group hierarchy
-        self.group_hierarchy[group_key]["packages"].append(pkg_key)
-        self.parent_map[pkg_key] = group_key
-
-        return pkg_key
+        return row
 
     def on_category_selected(self, list_box, row):
         """Handle category selection and expansion logic"""
         if not row:
             return
 
-        group_data = getattr(row, "group_data", None)
-        group_key = getattr(row, "group_key", None)
-        has_subgroups = getattr(row, "has_subgroups", False)
-        depth = getattr(row, "depth", 0)
+        if row.node is None:
+            if row.group_key == "grp:selected":
+                self.show_packages(
+                    row.group_key,
+                    "Selected Applications",
+                    "All applications you have selected so far.",
+                    self.selected_entries(),
+                )
+            else:
+                self.show_packages(
+                    row.group_key,
+                    "Search Results",
+                    "All matching applications",
+                    row.entries,
+                )
+            return
 
+        node = row.node
         # Check if category is empty (no packages and no valid subgroups after arch filtering)
-        packages = (
-            group_data.get("packages", []) if isinstance(group_data, dict) else []
-        )
-        has_packages = any(
-            self.is_valid_package(pkg) and self.is_arch_compatible(pkg)
-            for pkg in packages
-        )
-        subgroups = (
-            group_data.get("subgroups", []) if isinstance(group_data, dict) else []
-        )
-        has_valid_subgroups = any(
-            self.is_valid_group(sg) and self.is_arch_compatible(sg) for sg in subgroups
-        )
-        if not has_packages and not has_valid_subgroups:
+        has_packages = bool(self.tree.packages(node))
+        if not has_packages and not row.has_subgroups:
             return  # Do nothing if category is truly empty
 
         # Pre-select children if group/subgroup is selected
-        if isinstance(group_data, dict) and group_data.get("selected", False):
-            self.select_group_and_children(group_data, group_key)
+        if self.tree.attr(node, "selected", False):
+            self.select_group(node)
 
         # If it has subgroups, expand always
-        if has_subgroups:
-            if not getattr(row, "expanded", False):
-                self.expand_category(row, group_data, depth)
+        if row.has_subgroups:
+            if not row.expanded:
+                self.expand_category(row)
             # Only select and show packages if there are packages
             if has_packages:
                 self.categories_list.select_row(row)
-                self.show_category_packages(group_data, group_key)
+                self.show_category_packages(node)
         else:
             self.categories_list.select_row(row)
-            self.show_category_packages(group_data, group_key)
-
-    def select_group_and_children(self, group_data, group_key):
-        """Recursively select group/subgroup and its children packages/subgroups"""
-        selected = group_data.get("selected")
-        if selected is False:
-            return  #
-
-        self.selection_state[group_key] = True
-        packages = group_data.get("packages", [])
-        for pkg_data in packages:
-            if self.is_valid_package(pkg_data) and self.is_arch_compatible(pkg_data):
-                if isinstance(pkg_data, dict):
-                    pkg_name = pkg_data.get("name", "")
-                else:
-                    pkg_name = pkg_data
-                pkg_key = f"pkg:{group_key}/{pkg_name}"
-                self.selection_state[pkg_key] = True
-                checkbox = self.checkboxes.get(pkg_key)
-                if checkbox:
-                    checkbox.set_active(True)
-
-        # Recurse into subgroups
-        subgroups = group_data.get("subgroups", [])
-        for sg in subgroups:
-            if self.is_valid_group(sg) and self.is_arch_compatible(sg):
-                sg_name = sg.get("name", "Unnamed")
-                sg_key = f"grp:{'/'.join(group_key.split('/')[1:] + [sg_name])}"
-                self.select_group_and_children(sg, sg_key)
-
-    def expand_category(self, row, group_data, depth):
+            self.show_category_packages(node)
+
+    def select_group(self, node):
+        """Select a group's subtree, skipping subgroups that opt out"""
+        before = self.selection.snapshot()
+        for start, end in self.tree.group_ranges(node):
+            self.selection.set_range(start, end, True)
+        self.selection.record(before)
+        self.queue_refresh()
+
+    def expand_category(self, row):
         """Expand category to show subgroups (arrow down)"""
         row.expanded = True
-        row_box = row.get_child()
-        children = []
-        child = row_box.get_first_child()
-        while child:
-            children.append(child)
-            child = child.get_next_sibling()
-        if children and isinstance(children[-1], Gtk.Image):
-            children[-1].set_from_icon_name("go-down-symbolic")
-        row_index = self.get_row_index(row)
-        subgroups = group_data.get("subgroups", [])
-        parent_path = group_data.get("name", "").split("/")
-        for i, sub_data in enumerate(subgroups):
-            if self.is_valid_group(sub_data) and self.is_arch_compatible(sub_data):
-                self.insert_category_row(
-                    sub_data, parent_path, depth + 1, row_index + i + 1
-                )
+        row.arrow_icon.set_from_icon_name("go-down-symbolic")
+        index = row.get_index()
+        for i, node in enumerate(self.tree.subgroups(row.node)):
+            self.categories_list.insert(
+                self.make_category_row(node, row.depth + 1), index + i + 1
+            )
 
     def collapse_category(self, row):
         """Collapse category to hide subgroups (arrow right)"""
         row.expanded = False
-        row_box = row.get_child()
-        children = []
-        child = row_box.get_first_child()
-        while child:
-            children.append(child)
-            child = child.get_next_sibling()
-        if children and isinstance(children[-1], Gtk.Image):
-            children[-1].set_from_icon_name("go-next-symbolic")
+        row.arrow_icon.set_from_icon_name("go-next-symbolic")
         self.remove_subgroup_rows(row)
 
-    def insert_category_row(self, group_data, parent_path, depth, index):
-        """Insert a category row at specific index"""
-        name = group_data.get("name", "Unnamed")
-        current_path = parent_path + [name]
-        group_key = self.make_group_key(current_path)
-        row = Gtk.ListBoxRow.new()
-        row.group_data = group_data
-        row.group_key = group_key
-        row.depth = depth
-        row.is_subgroup = True
-        row_box = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, spacing=8)
-        set_margins(row_box, 8 + (depth * 16), 8, 8, 8)
-        icon_name = group_data.get("icon")
-        if icon_name:
-            icon = Gtk.Image.new_from_icon_name(icon_name)
-            icon.set_icon_size(Gtk.IconSize.NORMAL)
-            row_box.append(icon)
-        label = Gtk.Label.new(name)
-        label.set_wrap(True)  # <-- Use set_wrap for GTK4
-        label.set_max_width_chars(24)
-        label.set_ellipsize(Pango.EllipsizeMode.NONE)
-        row_box.append(label)
-        # Show expand arrow as a flat button if this subgroup has subgroups
-        subgroups = group_data.get("subgroups", [])
-        has_subgroups = any(
-            self.is_valid_group(sg) and self.is_arch_compatible(sg) for sg in subgroups
-        )
-        if has_subgroups:
-            arrow_icon = Gtk.Image.new_from_icon_name("go-next-symbolic")
-            arrow_icon.set_icon_size(Gtk.IconSize.NORMAL)
-            arrow_btn = Gtk.Button.new()
-            arrow_btn.set_child(arrow_icon)
-            arrow_btn.add_css_class("flat")
-            arrow_btn.set_focusable(False)
-            row_box.append(arrow_btn)
-            row.has_subgroups = True
-            row.expanded = False
-
-            def on_arrow_clicked(
-                btn, row=row, group_data=group_data, depth=depth, arrow_icon=arrow_icon
-            ):
-                if getattr(row, "expanded", False):
-                    self.collapse_category(row)
-                    arrow_icon.set_from_icon_name("go-next-symbolic")
-                else:
-                    self.expand_category(row, group_data, depth)
-                    arrow_icon.set_from_icon_name("go-down-symbolic")
-
-            arrow_btn.connect("clicked", on_arrow_clicked)
-        row.set_child(row_box)
-        self.categories_list.insert(row, index)
-
-    def get_row_index(self, target_row):
-        """Get the index of a row in the list"""
-        index = 0
-        row = self.categories_list.get_row_at_index(0)
-        while row:
-            if row == target_row:
-                return index
-            index += 1
-            row = self.categories_list.get_row_at_index(index)
-        return -1
-
     def remove_subgroup_rows(self, parent_row):
-        """Remove all subgroup rows after the parent"""
-        parent_index = self.get_row_index(parent_row)
-        if parent_index == -1:
-            return
-
-        rows_to_remove = []
-        index = parent_index + 1
+        """Remove all rows nested below the parent"""
+        index = parent_row.get_index() + 1
         row = self.categories_list.get_row_at_index(index)
-
-        # Use Python attribute instead of get_data
-        while row and getattr(row, "is_subgroup", False):
-            rows_to_remove.append(row)
-            index += 1
-            row = self.categories_list.get_row_at_index(index)
-
-        for row in rows_to_remove:
+        while row and row.depth > parent_row.depth:
             self.categories_list.remove(row)
+            row = self.categories_list.get_row_at_index(index)
 
-    def show_category_packages(self, group_data, group_key):
+    def show_category_packages(self, node):
         """Show only packages for the selected group/subgroup"""
+        self.show_packages(
+            self.tree.key[node],
+            self.tree.name[node],
+            self.tree.attr(node, "description", ""),
+            self.tree.packages(node),
+        )
+
+    def show_packages(self, group_key, category_name, description, entries):
+        """
+        Fill the applications panel.
+
+        Entries are either package tree nodes or AppStream result dicts.
+        """
         self.current_category = group_key
-        category_name = group_data.get("name", "Category")
         self.applications_label.set_text(f"Select Applications - {category_name}")
 
         # Remove any previous description label if present
-        if hasattr(self, "category_desc_label") and self.category_desc_label:
+        if self.category_desc_label:
             parent = self.category_desc_label.get_parent()
             if parent:
                 parent.remove(self.category_desc_label)
             self.category_desc_label = None
 
         # Add category description label under header, dimmed
-        description = group_data.get("description", "")
         if description:
             desc_label = Gtk.Label.new(description)
             set_margins(desc_label, 0, 0, 0, 8)
@@ -480,54 +406,20 @@ class packages_screen(Gtk.Box):
                 right_panel.insert_child_after(desc_label, self.applications_label)
             self.category_desc_label = desc_label
 
-        # Clear current applications list
-        child = self.applications_list.get_first_child()
-        while child:
-            next_child = child.get_next_sibling()
-            self.applications_list.remove(child)
-            child = next_child
-
-        # Show only packages for this group/subgroup
-        packages = group_data.get("packages", [])
-        for pkg_data in packages:
-            # --- For Selected Applications category, always tick selected ---
-            if group_key == "grp:selected":
-                # Find the key for this package
-                if isinstance(pkg_data, dict):
-                    pkg_name = pkg_data.get("name", pkg_data.get("pkgname", ""))
-                    # Try both normal and appstream keys
-                    pkg_key = f"pkg:{pkg_name}"
-                    # Find the actual key in selection_state
-                    found_key = None
-                    for k in self.selection_state:
-                        if k.endswith(f"/{pkg_name}") or k.endswith(
-                            f"/{pkg_data.get('pkgname', '')}"
-                        ):
-                            found_key = k
-                            break
-                    if found_key:
-                        self.selection_state[found_key] = True
-                elif isinstance(pkg_data, str):
-                    pkg_key = None
-                    for k in self.selection_state:
-                        if k.endswith(f"/{pkg_data}"):
-                            pkg_key = k
-                            break
-                    if pkg_key:
-                        self.selection_state[pkg_key] = True
-            # ...existing code...
-            if self.is_valid_package(pkg_data) and self.is_arch_compatible(pkg_data):
-                pkg_row = self.create_application_row(pkg_data, group_key)
-                if pkg_row:
-                    # Attach metadata for AppStream/Flatpak rows
-                    if isinstance(pkg_data, dict) and pkg_data.get("appstream"):
-                        pkg_key = f"pkg:appstream/{pkg_data.get('pkgname', pkg_data.get('name', ''))}"
-                        self.package_metadata[pkg_key] = pkg_data
-                        # Attach metadata to checkbox for reliable retrieval
-                        checkbox = pkg_row.get_last_child()
-                        if checkbox:
-                            checkbox.row_data = pkg_data
-                    self.applications_list.append(pkg_row)
+        self.instruction_label.set_visible(False)
+        items = [self.make_package_item(entry) for entry in entries]
+        self.app_store.splice(
+            0, self.app_store.get_n_items(), [i for i in items if i is not None]
+        )
+
+    def selected_entries(self):
+        """Every selected package, deduplicated by name and sorted"""
+        entries = {}
+        for i in self.selection.selected_packages():
+            entries.setdefault(self.tree.name[i], i)
+        for pkg_data in self.selection.extra.values():
+            entries.setdefault(pkg_data.get("name") or pkg_data["pkgname"], pkg_data)
+        return [entries[name] for name in sorted(entries)]
 
     def build_ui(self):
         lp("Building two-panel package selection UI", "info")
@@ -553,8 +445,7 @@ class packages_screen(Gtk.Box):
         right_box = self.build_applications_panel()
         main_box.append(right_box)
 
-        # Remove self._select_first_category()
-        # Instead, show instructions in applications panel
+        # Show instructions in applications panel until a category is picked
         instruction_label = Gtk.Label.new(
             "Select a category on the left to view and choose applications.\n"
             "You can also search for packages or categories using the search box."
@@ -564,306 +455,207 @@ class packages_screen(Gtk.Box):
         instruction_label.set_margin_top(24)
         instruction_label.set_margin_bottom(24)
         instruction_label.add_css_class("dim-label")
-        self.applications_list.append(instruction_label)
-
-    def init_all_package_checkboxes(self):
-        """Create checkboxes for all packages in all groups/subgroups so their state can be set"""
-
-        def recurse(groups, parent_path):
-            for grp_data in groups:
-                if not (
-                    self.is_valid_group(grp_data) and self.is_arch_compatible(grp_data)
-                ):
-                    continue
-                name = grp_data.get("name", "Unnamed")
-                current_path = parent_path + [name]
-                group_key = self.make_group_key(current_path)
-                packages = grp_data.get("packages", [])
-                for pkg_data in packages:
-                    if self.is_valid_package(pkg_data) and self.is_arch_compatible(
-                        pkg_data
-                    ):
-                        pkg_key = self.create_package_key(
-                            pkg_data, current_path, group_key
-                        )
-                        # Create a dummy checkbox for each package so apply_default_selections can set its state
-                        if pkg_key not in self.checkboxes:
-                            checkbox = Gtk.CheckButton.new()
-                            self.checkboxes[pkg_key] = checkbox
-                subgroups = grp_data.get("subgroups", [])
-                if subgroups:
-                    recurse(subgroups, current_path)
-
-        groups = self.packages if isinstance(self.packages, list) else [self.packages]
-        recurse(groups, [])
-
-    def create_application_row(self, pkg_data, group_key):
-        """Create an application row for the right panel"""
-        # Normalize package data
-        if isinstance(pkg_data, str):
-            name = pkg_data
-            description = ""
-            selected = False
-            immutable = False
-            icon_name = None
-            is_appstream = False
-            pkg_key = f"pkg:{group_key}/{name}"
+        right_box.insert_child_after(instruction_label, self.applications_label)
+        self.instruction_label = instruction_label
+
+    def make_package_item(self, entry):
+        """Create the list model item for a tree node or an AppStream result"""
+        item = PackageItem()
+        item.entry = entry
+        if isinstance(entry, int):
+            name = self.tree.name[entry]
+            item.props.key = self.tree.key[entry]
+            item.props.description = self.tree.attr(entry, "description", "") or ""
+            item.props.immutable = self.tree.immutable(entry)
+            icon_name = self.tree.attr(entry, "icon")
             origin = None
         else:
-            name = pkg_data.get("name", "")
-            description = pkg_data.get("description", "")
-            selected = pkg_data.get("selected", False)
-            immutable = pkg_data.get("immutable", False) or pkg_data.get(
-                "critical", False
-            )
-            icon_name = pkg_data.get("icon")
-            is_appstream = pkg_data.get("appstream", False)
-            origin = pkg_data.get("origin")
+            name = entry.get("name", "")
             # For AppStream results, use pkgname for key uniqueness
-            if is_appstream:
-                pkg_key = f"pkg:appstream/{pkg_data.get('pkgname', name)}"
-            else:
-                pkg_key = f"pkg:{group_key}/{name}"
+            item.props.key = f"pkg:appstream/{entry.get('pkgname', name)}"
+            item.props.description = entry.get("description", "") or ""
+            icon_name = entry.get("icon")
+            origin = entry.get("origin")
 
         if not name:
             return None
 
-        if pkg_key not in self.selection_state:
-            self.selection_state[pkg_key] = selected
-
-        action_row = Adw.ActionRow.new()
         # --- Show Flatpak or ArchLinux origin in title ---
-        display_name = name
-        if is_appstream and origin == "flatpak":
-            display_name = f"{name} - Flatpak"
+        if origin == "flatpak":
+            name = f"{name} - Flatpak"
         elif origin and str(origin).startswith("archlinux-arch-"):
-            display_name = f"{name} - ArchLinux Repositories"
-        action_row.set_title(display_name)
-        if description:
-            safe_description = self.escape_html(description)
-            action_row.set_subtitle(safe_description)
-        # Show icon if available
-        if icon_name:
-            # Fix: handle tuple icons from AppStream
-            if isinstance(icon_name, tuple):
-                icon_name = icon_name[0] if icon_name else None
-            if isinstance(icon_name, str) and icon_name and path.isfile(icon_name):
-                icon_widget = Gtk.Image.new_from_file(icon_name)
-                icon_widget.set_icon_size(Gtk.IconSize.NORMAL)
-                action_row.add_prefix(icon_widget)
-
+            name = f"{name} - ArchLinux Repositories"
+        item.props.name = name
+        if isinstance(icon_name, str):
+            item.props.icon = icon_name
+        return item
+
+    def on_app_setup(self, factory, list_item):
+        box = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, spacing=12)
+        set_margins(box, 6, 6, 6, 6)
+        image = Gtk.Image.new()
+        image.set_icon_size(Gtk.IconSize.NORMAL)
+        box.append(image)
+        labels = Gtk.Box.new(Gtk.Orientation.VERTICAL, spacing=2)
+        labels.set_hexpand(True)
+        labels.set_valign(Gtk.Align.CENTER)
+        title = Gtk.Label(xalign=0)
+        title.set_wrap(True)
+        labels.append(title)
+        subtitle = Gtk.Label(xalign=0)
+        subtitle.set_wrap(True)
+        subtitle.set_wrap_mode(Pango.WrapMode.WORD_CHAR)
+        subtitle.add_css_class("dim-label")
+        subtitle.add_css_class("caption")
+        labels.append(subtitle)
+        box.append(labels)
         checkbox = Gtk.CheckButton.new()
-        checkbox.set_active(
-            True
-            if pkg_key.startswith("pkg:grp:selected/")
-            else self.selection_state.get(pkg_key, selected)
-        )
-        checkbox.set_sensitive(not immutable)
-        self.checkboxes[pkg_key] = checkbox
-        checkbox.connect("toggled", self.on_application_toggled, pkg_key)
-        action_row.add_suffix(checkbox)
-        action_row.set_activatable_widget(checkbox)
-        return action_row
-
-    def on_application_toggled(self, checkbox, pkg_key, first=False):
+        checkbox.set_valign(Gtk.Align.CENTER)
+        checkbox._item = None
+        checkbox.connect("toggled", self.on_application_toggled)
+        box.append(checkbox)
+        box._image = image
+        box._title = title
+        box._subtitle = subtitle
+        box._checkbox = checkbox
+        list_item.set_child(box)
+
+    def on_app_bind(self, factory, list_item):
+        item = list_item.get_item()
+        child = list_item.get_child()
+        child._title.set_text(item.props.name)
+        child._subtitle.set_text(item.props.description)
+        child._subtitle.set_visible(bool(item.props.description))
+        texture = icon_texture(item.props.icon) if item.props.icon else None
+        child._image.set_from_paintable(texture)
+        child._image.set_visible(texture is not None)
+        checkbox = child._checkbox
+        self._updating = True
+        try:
+            checkbox._item = item
+            checkbox.set_active(self.is_selected(item.props.key))
+            checkbox.set_sensitive(not item.props.immutable)
+        finally:
+            self._updating = False
+        self.checkboxes[item.props.key] = checkbox
+
+    def on_app_unbind(self, factory, list_item):
+        checkbox = list_item.get_child()._checkbox
+        item = checkbox._item
+        if item is not None and self.checkboxes.get(item.props.key) is checkbox:
+            del self.checkboxes[item.props.key]
+        checkbox._item = None
+
+    def on_app_activated(self, list_view, position):
+        """Toggle the package of an activated row"""
+        item = self.app_store.get_item(position)
+        checkbox = self.checkboxes.get(item.props.key) if item else None
+        if checkbox is not None and checkbox.get_sensitive():
+            checkbox.set_active(not checkbox.get_active())
+
+    def is_selected(self, pkg_key):
+        node = self.tree.index.get(pkg_key)
+        if node is not None:
+            return self.selection[node]
+        return pkg_key in self.selection.extra
+
+    def queue_refresh(self):
+        """Sync the shown checkboxes with the selection state on the next idle"""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            GLib.idle_add(self.refresh_checkboxes)
+
+    def refresh_checkboxes(self):
+        self._refresh_pending = False
+        self._updating = True
+        try:
+            for pkg_key, checkbox in self.checkboxes.items():
+                active = self.is_selected(pkg_key)
+                if checkbox.get_active() != active:
+                    checkbox.set_active(active)
+        finally:
+            self._updating = False
+        self.undo_btn.set_sensitive(bool(self.selection.history))
+        return False
+
+    def on_application_toggled(self, checkbox):
         """Handle application checkbox toggle"""
-        if self._updating:
+        if self._updating or checkbox._item is None:
             return
 
+        entry = checkbox._item.entry
         active = checkbox.get_active()
-        self.selection_state[pkg_key] = active
+        before = self.selection.snapshot()
+        if isinstance(entry, int):
+            pkg_name = self.tree.name[entry]
+            if active:
+                self.selection.set(entry, True)
+            else:
+                # Untick the package everywhere it is listed
+                self.selection.set_nodes(self.tree.by_name[pkg_name], False)
+        else:
+            pkg_name = entry.get("pkgname", entry.get("name", ""))
+            pkg_key = f"pkg:appstream/{pkg_name}"
+            if active:
+                self.selection.extra[pkg_key] = entry
+            else:
+                self.selection.extra.pop(pkg_key, None)
+        self.selection.record(before)
+        self.queue_refresh()
 
-        # If toggled in Selected Applications category, untick everywhere
-        child = self.categories_list.get_first_child()
-        if child:
-            group_data = getattr(child, "group_data", None)
-            if isinstance(group_data, dict) and group_data.get("_is_selected_category"):
-                # If unticked, untick everywhere for all keys matching the package name
-                if not active:
-                    # Extract package name from key
-                    pkg_name = None
-                    if pkg_key.startswith("pkg:appstream/"):
-                        # AppStream key
-                        pkg_name = pkg_key.split("/", 1)[1]
-                    else:
-                        # Normal key
-                        pkg_name = pkg_key.split("/")[-1]
-                    # Untick all keys that end with this package name
-                    for key, cb in self.checkboxes.items():
-                        cb.set_active(False)
-                        self.selection_state.pop(key, None)
-                        for i in self.selection_state:
-                            if pkg_name in i:
-                                self.selection_state[i] = False
-
-        self.update_selected_applications_category()
-        pkg_name = pkg_key.split("/")[-1]
         lp(f"Application '{pkg_name}' toggled to: {active}", "debug")
 
     def on_search_changed(self, search_entry):
-        """Handle search in categories and packages, including AppStream results"""
+        """Schedule a search once typing settles, superseding any pending one"""
         search_text = search_entry.get_text().lower().strip()
+        self._search_gen += 1
+        if self._search_timeout:
+            GLib.source_remove(self._search_timeout)
+        self._search_timeout = GLib.timeout_add(
+            SEARCH_DELAY, self.start_search, self._search_gen, search_text
+        )
 
-        # Remove previous search category if present
-        def remove_search_category():
-            child = self.categories_list.get_first_child()
-            while child:
-                group_data = getattr(child, "group_data", None)
-                if isinstance(group_data, dict) and group_data.get(
-                    "_is_search_category"
-                ):
-                    self.categories_list.remove(child)
-                    break
-                child = child.get_next_sibling()
-
-        remove_search_category()
-
-        # Step 1: Expand all groups and subgroups
-        def expand_all_rows():
-            child = self.categories_list.get_first_child()
-            while child:
-                if getattr(child, "has_subgroups", False) and not getattr(
-                    child, "expanded", False
-                ):
-                    self.expand_category(child, child.group_data, child.depth)
-                child = child.get_next_sibling()
-            # Recursively expand subgroups
-            expanded = True
-            while expanded:
-                expanded = False
-                child = self.categories_list.get_first_child()
-                while child:
-                    if getattr(child, "has_subgroups", False) and not getattr(
-                        child, "expanded", False
-                    ):
-                        self.expand_category(child, child.group_data, child.depth)
-                        expanded = True
-                    child = child.get_next_sibling()
-
-        expand_all_rows()
-
-        # Step 2: Filter rows according to search
+    def start_search(self, gen, search_text):
+        self._search_timeout = 0
         if not search_text:
-            # Show all rows if search is empty
-            child = self.categories_list.get_first_child()
-            while child:
-                child.set_visible(True)
-                # Collapse all expanded categories
-                if getattr(child, "has_subgroups", False) and getattr(
-                    child, "expanded", False
-                ):
-                    self.collapse_category(child)
-                child = child.get_next_sibling()
-            # Show applications for selected category only
-            selected_row = self.categories_list.get_selected_row()
-            if selected_row:
-                self.show_category_packages(
-                    selected_row.group_data, selected_row.group_key
-                )
-            return
-
-        def subgroup_matches(subgroups):
-            for sg in subgroups:
-                if not isinstance(sg, dict):
-                    continue
-                sg_name = sg.get("name") or ""
-                sg_desc = sg.get("description") or ""
-                if search_text in sg_name.lower() or search_text in sg_desc.lower():
-                    return True
-                for pkg in sg.get("packages", []):
-                    if isinstance(pkg, dict):
-                        pkg_name = pkg.get("name") or ""
-                        pkg_desc = pkg.get("description") or ""
-                        if (
-                            search_text in pkg_name.lower()
-                            or search_text in pkg_desc.lower()
-                        ):
-                            return True
-                    elif isinstance(pkg, str):
-                        if search_text in pkg.lower():
-                            return True
-                # Recurse further
-                if subgroup_matches(sg.get("subgroups", [])):
-                    return True
-            return False
-
-        # Step 3: Filter categories/subgroups
-        child = self.categories_list.get_first_child()
-        while child:
-            group_data = getattr(child, "group_data", None)
-            show_row = False
-
-            if isinstance(group_data, dict):
-                name = group_data.get("name") or ""
-                description = group_data.get("description") or ""
-                if search_text in name.lower() or search_text in description.lower():
-                    show_row = True
-                for pkg in group_data.get("packages", []):
-                    if isinstance(pkg, dict):
-                        pkg_name = pkg.get("name") or ""
-                        pkg_desc = pkg.get("description") or ""
-                        if (
-                            search_text in pkg_name.lower()
-                            or search_text in pkg_desc.lower()
-                        ):
-                            show_row = True
-                            break
-                    elif isinstance(pkg, str):
-                        if search_text in pkg.lower():
-                            show_row = True
-                            break
-                if not show_row and subgroup_matches(group_data.get("subgroups", [])):
-                    show_row = True
-
-            child.set_visible(show_row)
-            child = child.get_next_sibling()
+            self.apply_search(gen, search_text, None)
+        else:
+            threading.Thread(
+                target=self.search_worker, args=(gen, search_text), daemon=True
+            ).start()
+        return False  # Stop timeout_add
+
+    def search_worker(self, gen, search_text):
+        """Run a search off the main thread, results are applied on idle"""
+        matched = self.search_index.search(search_text)
+
+        # A group is shown when anything in its subtree matched
+        shown = set()
+        for node in matched:
+            while node >= 0 and node not in shown:
+                shown.add(node)
+                node = self.tree.parent[node]
+
+        # Collect matching packages for the search category, best first
+        matches = []
+        seen_names = set()
+        for node in matched:
+            name = self.tree.name[node]
+            if self.tree.kind[node] == PACKAGE and name not in seen_names:
+                matches.append(node)
+                seen_names.add(name)
+                # Limit local matches to 15
+                if len(matches) >= 15:
+                    break
 
-        # Step 4: Collect all matching packages for the search category
-        def collect_matching_packages(groups):
-            matches = []
-            seen_names = set()
-
-            def recurse(grp, group_key):
-                packages = grp.get("packages", [])
-                for pkg in packages:
-                    if self.is_valid_package(pkg) and self.is_arch_compatible(pkg):
-                        if isinstance(pkg, dict):
-                            pkg_name = pkg.get("name", "")
-                            pkg_desc = pkg.get("description", "")
-                            if (
-                                search_text in pkg_name.lower()
-                                or search_text in pkg_desc.lower()
-                            ):
-                                if pkg_name and pkg_name not in seen_names:
-                                    matches.append(pkg)
-                                    seen_names.add(pkg_name)
-                        elif isinstance(pkg, str):
-                            if search_text in pkg.lower():
-                                if pkg not in seen_names:
-                                    matches.append(pkg)
-                                    seen_names.add(pkg)
-                for sg in grp.get("subgroups", []):
-                    if self.is_valid_group(sg) and self.is_arch_compatible(sg):
-                        recurse(sg, group_key)
-
-            groups_list = groups if isinstance(groups, list) else [groups]
-            for grp in groups_list:
-                if self.is_valid_group(grp) and self.is_arch_compatible(grp):
-                    recurse(grp, grp.get("name", ""))
-            return matches
-
-        matches = collect_matching_packages(self.packages)
-
-        # Limit local matches to 15
-        matches = matches[:15]
+        if gen != self._search_gen:
+            return  # Superseded while searching
 
         # --- AppStream search integration ---
         appstream_matches = []
         seen_pkgnames = set()
         try:
-            appstream_results = search_appstream(search_text)
-            for component in appstream_results:
-                info = get_appstream_app_info(component)
+            for info in search_appstream(search_text):
                 pkgname = info.get("package")
                 # If origin is flatpak and package is None, use id as package name
                 if info.get("origin") == "flatpak" and not pkgname:
@@ -873,360 +665,114 @@ class packages_screen(Gtk.Box):
                     continue
                 seen_pkgnames.add(pkgname)
                 # Only add if not already present in matches (by pkgname)
-                if not any(
-                    (isinstance(pkg, dict) and pkg.get("name") == pkgname)
-                    or (isinstance(pkg, str) and pkg == pkgname)
-                    for pkg in matches
-                ):
-                    appstream_dict = {
-                        "name": info.get("name", pkgname),
-                        "description": info.get("description", ""),
-                        "icon": info.get("icon"),
-                        "pkgname": pkgname,
-                        "origin": info.get("origin"),
-                        "id": info.get("id"),
-                        "keywords": info.get("keywords"),
-                        "selected": False,
-                        "appstream": True,
-                    }
-                    appstream_matches.append(appstream_dict)
+                if pkgname not in seen_names:
+                    appstream_matches.append(
+                        {
+                            "name": info.get("name", pkgname),
+                            "description": info.get("description", ""),
+                            "icon": info.get("icon"),
+                            "pkgname": pkgname,
+                            "origin": info.get("origin"),
+                            "id": info.get("id"),
+                            "keywords": info.get("keywords"),
+                            "selected": False,
+                            "appstream": True,
+                        }
+                    )
                 # Limit AppStream matches to 15
                 if len(appstream_matches) >= 15:
                     break
         except Exception as e:
             lp(f"AppStream search error: {e}", "warn")
 
-        # Add AppStream results to matches
-        matches.extend(appstream_matches)
+        if gen == self._search_gen:
+            GLib.idle_add(
+                self.apply_search,
+                gen,
+                search_text,
+                (shown, matches + appstream_matches),
+            )
 
-        search_category_data = {
-            "name": "Search Results",
-            "description": "All matching applications",
-            "icon": "system-search-symbolic",
-            "packages": matches,
-            "_is_search_category": True,
-            "hidden": True,
-        }
-        search_row = Gtk.ListBoxRow.new()
-        search_row.group_data = search_category_data
-        search_row.group_key = "grp:search"
-        search_row.depth = 0
-        search_row.is_search_category = True
-        row_box = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, spacing=8)
-        row_box.set_margin_top(8)
-        row_box.set_margin_bottom(8)
-        row_box.set_margin_start(8)
-        row_box.set_margin_end(8)
-        icon = Gtk.Image.new_from_icon_name("system-search-symbolic")
-        icon.set_icon_size(Gtk.IconSize.NORMAL)
-        row_box.append(icon)
-        label = Gtk.Label.new("Search Results")
-        label.set_halign(Gtk.Align.START)
-        label.set_hexpand(True)
-        row_box.append(label)
-        search_row.set_child(row_box)
+    def apply_search(self, gen, search_text, results):
+        """Update the categories panel with the results of a search"""
+        if gen != self._search_gen:
+            return False  # A newer search is pending
+
+        # Remove previous search category if present
+        first = self.categories_list.get_row_at_index(0)
+        if first is not None and first.group_key == "grp:search":
+            self.categories_list.remove(first)
+
+        if not search_text:
+            # Show all rows and collapse all expanded categories
+            child = self.categories_list.get_first_child()
+            while child:
+                child.set_visible(True)
+                if getattr(child, "has_subgroups", False) and child.expanded:
+                    self.collapse_category(child)
+                child = child.get_next_sibling()
+            # Show applications for selected category only
+            selected_row = self.categories_list.get_selected_row()
+            if selected_row:
+                self.on_category_selected(self.categories_list, selected_row)
+            return False
+
+        shown, entries = results
+
+        # Expand all groups and subgroups, then filter them
+        child = self.categories_list.get_first_child()
+        while child:
+            if getattr(child, "has_subgroups", False) and not child.expanded:
+                self.expand_category(child)
+            child = child.get_next_sibling()
+        child = self.categories_list.get_first_child()
+        while child:
+            child.set_visible(child.node is None or child.node in shown)
+            child = child.get_next_sibling()
+
+        search_row = self.make_special_row(
+            "grp:search", "Search Results", "system-search-symbolic"
+        )
+        search_row.entries = entries
         self.categories_list.insert(search_row, 0)
         self.categories_list.select_row(search_row)
-        self.show_category_packages(search_category_data, "grp:search")
+        return False
 
     def on_default_selections(self, button):
         """Handle default package selections button"""
+        self.selection.reset()
+        self.queue_refresh()
 
-        # Reset all selections
-        for key in self.selection_state:
-            self.selection_state[key] = False
-            checkbox = self.checkboxes.get(key)
-            if checkbox:
-                checkbox.set_active(False)
-
-        # Apply default selections from package data
-        groups = self.packages if isinstance(self.packages, list) else [self.packages]
-        self.apply_default_selections(groups, [])
-
-    def apply_default_selections(self, groups, parent_path):
-        """Recursively apply default selections"""
-        for grp_data in groups:
-            if not (
-                self.is_valid_group(grp_data) and self.is_arch_compatible(grp_data)
-            ):
-                continue
-
-            name = grp_data.get("name", "Unnamed")
-            current_path = parent_path + [name]
-
-            # Apply defaults to packages in this group
-            packages = grp_data.get("packages", [])
-            for pkg_data in packages:
-                if self.is_valid_package(pkg_data) and self.is_arch_compatible(
-                    pkg_data
-                ):
-                    if isinstance(pkg_data, dict) and pkg_data.get("selected", False):
-                        pkg_name = pkg_data.get("name", "")
-                        pkg_key = f"pkg:{self.make_group_key(current_path)}/{pkg_name}"
-                        # Ensure package_metadata is set for collect_data and selection
-                        self.package_metadata[pkg_key] = {
-                            "name": pkg_name,
-                            "post_install": pkg_data.get("post-install"),
-                            "data": pkg_data,
-                        }
-                        self.selection_state[pkg_key] = True
-                        checkbox = self.checkboxes.get(pkg_key)
-                        if checkbox:
-                            checkbox.set_active(True)
-
-            # Recurse into subgroups
-            subgroups = grp_data.get("subgroups", [])
-            if subgroups:
-                self.apply_default_selections(subgroups, current_path)
-
-    def is_valid_group(self, data):
-        """Check if group data is valid"""
-        return isinstance(data, dict) and data.get("name")
-
-    def make_group_key(self, path):
-        """Create unique key for group"""
-        return "grp:" + "/".join(path)
-
-    def make_package_key(self, path, name):
-        """Create unique key for package"""
-        return "pkg:" + "/".join(path + [name])
-
-    def is_valid_package(self, data):
-        """Check if package data is valid"""
-        if isinstance(data, str):
-            return True
-        return isinstance(data, dict) and data.get("name")
+    def on_undo(self, button):
+        """Revert the last selection change"""
+        if self.selection.undo():
+            self.queue_refresh()
 
     def collect_data(self):
         """Get selected packages, post-install scripts, and flatpaks"""
-        selected_packages = []
-        post_install_scripts = []
+        selected_packages, post_install_scripts = self.tree.collect(self.selection.bits)
         selected_flatpaks = []
 
-        # Collect selected packages
-        for key, is_selected in self.selection_state.items():
-            if key.startswith("pkg:appstream/") and is_selected:
-                # AppStream/Flatpak selection
-                metadata = None
-                # Try to find the dict in checkboxes (row data)
-                checkbox = self.checkboxes.get(key)
-                if checkbox and hasattr(checkbox, "row_data"):
-                    metadata = checkbox.row_data
-                # Fallback: try to get from package_metadata
-                if not metadata:
-                    metadata = self.package_metadata.get(key, {})
-                pkgname = None
-                origin = None
-                if isinstance(metadata, dict):
-                    pkgname = metadata.get("pkgname") or metadata.get("name")
-                    origin = metadata.get("origin")
-                else:
-                    # fallback for str
-                    pkgname = key.split("/")[-1]
-                if origin == "flatpak":
-                    selected_flatpaks.append(pkgname)
-                else:
-                    selected_packages.append(pkgname)
-            elif key.startswith("pkg:") and is_selected:
-                metadata = self.package_metadata.get(key, {})
-                pkg_name = metadata.get("name", key.split("/")[-1])
-                selected_packages.append(pkg_name)
-                post_install = metadata.get("post_install")
-                if post_install:
-                    post_install_scripts.append(post_install)
-        # Collect post-install scripts from selected groups
-        for key, is_selected in self.selection_state.items():
-            if key.startswith("grp:") and is_selected:
-                metadata = self.group_metadata.get(key, {})
-                post_install = metadata.get("post_install")
-                if post_install:
-                    post_install_scripts.append(post_install)
+        for pkg_data in self.selection.extra.values():
+            pkgname = pkg_data.get("pkgname") or pkg_data.get("name")
+            if pkg_data.get("origin") == "flatpak":
+                selected_flatpaks.append(pkgname)
+            else:
+                selected_packages.append(pkgname)
 
         # Remove duplicates while preserving order
         unique_packages = [
             pkg for pkg in dict.fromkeys(selected_packages) if pkg
         ]  # filter out None/empty
-        unique_scripts = [
-            script for script in dict.fromkeys(post_install_scripts) if script
-        ]
         unique_flatpaks = [fp for fp in dict.fromkeys(selected_flatpaks) if fp]
 
         lp(
-            f"Selected {len(unique_packages)} packages, {len(unique_flatpaks)} flatpaks, with {len(unique_scripts)} post-install scripts",
+            f"Selected {len(unique_packages)} packages, {len(unique_flatpaks)} flatpaks, with {len(post_install_scripts)} post-install scripts",
             "info",
         )
 
         return {
             "packages": sorted(unique_packages),
-            "post_install_scripts": unique_scripts,
+            "post_install_scripts": post_install_scripts,
             "flatpaks": sorted(unique_flatpaks),
         }
-
-    def is_arch_compatible(self, item_data):
-        """Check if package/group is compatible with current architecture"""
-        if not isinstance(item_data, dict):
-            return True  # String packages have no arch restrictions
-
-        required_arch = item_data.get("arch")
-        if not required_arch:
-            return True  # No arch restriction means compatible with all
-
-        # Handle both single arch and list of arches
-        if isinstance(required_arch, str):
-            required_archs = [required_arch]
-        else:
-            required_archs = required_arch
-
-        return self.current_arch in required_archs
-
-    def select_all_default_packages(self):
-        """Recursively select all packages in groups/subgroups with selected=True, unless overridden."""
-
-        def recurse(groups, parent_path, parent_selected=False):
-            for grp_data in groups:
-                if not (
-                    self.is_valid_group(grp_data) and self.is_arch_compatible(grp_data)
-                ):
-                    lp(
-                        f"Skipping group: {grp_data.get('name', 'Unnamed')} (invalid or not arch compatible)",
-                        "debug",
-                    )
-                    continue
-                name = grp_data.get("name", "Unnamed")
-                current_path = parent_path + [name]
-                group_key = self.make_group_key(current_path)
-                # Determine if this group is selected by default
-                group_selected = grp_data.get("selected", parent_selected)
-                packages = grp_data.get("packages", [])
-                for pkg_data in packages:
-                    if self.is_valid_package(pkg_data) and self.is_arch_compatible(
-                        pkg_data
-                    ):
-                        # If parent group is selected, select package unless package.selected is False
-                        pkg_selected = group_selected
-                        if isinstance(pkg_data, dict) and "selected" in pkg_data:
-                            pkg_selected = pkg_data["selected"]
-                        if pkg_selected:
-                            pkg_name = (
-                                pkg_data.get("name", "")
-                                if isinstance(pkg_data, dict)
-                                else pkg_data
-                            )
-                            pkg_key = f"pkg:{group_key}/{pkg_name}"
-                            self.selection_state[pkg_key] = True
-                subgroups = grp_data.get("subgroups", [])
-                if subgroups:
-                    recurse(subgroups, current_path, group_selected)
-
-        groups = self.packages if isinstance(self.packages, list) else [self.packages]
-        recurse(groups, [], False)
-
-    def show_selected_applications_category(self):
-        """Show the Selected Applications category with all currently selected packages and add to groups"""
-        selected_pkgs = []
-        seen_names = set()
-        for key, is_selected in self.selection_state.items():
-            if key.startswith("pkg:") and is_selected:
-                pkg_data = self.package_metadata.get(key, {}).get(
-                    "data", key.split("/")[-1]
-                )
-                # Get name for deduplication
-                pkg_name = None
-                if isinstance(pkg_data, dict):
-                    pkg_name = (
-                        pkg_data.get("name") or pkg_data.get("pkgname") or str(pkg_data)
-                    )
-                else:
-                    pkg_name = str(pkg_data)
-                if pkg_name and pkg_name not in seen_names:
-                    selected_pkgs.append(pkg_data)
-                    seen_names.add(pkg_name)
-            elif key.startswith("pkg:appstream/") and is_selected:
-                pkg_data = self.package_metadata.get(key, {})
-                if not pkg_data:
-                    checkbox = self.checkboxes.get(key)
-                    if checkbox and hasattr(checkbox, "row_data"):
-                        pkg_data = checkbox.row_data
-                pkg_name = None
-                if isinstance(pkg_data, dict):
-                    pkg_name = (
-                        pkg_data.get("name") or pkg_data.get("pkgname") or str(pkg_data)
-                    )
-                else:
-                    pkg_name = str(pkg_data)
-                if pkg_name and pkg_name not in seen_names:
-                    selected_pkgs.append(pkg_data if pkg_data else key.split("/")[-1])
-                    seen_names.add(pkg_name)
-
-        # Sort selected_pkgs alphabetically by name (dict or str)
-        def get_pkg_name(pkg):
-            if isinstance(pkg, dict):
-                return pkg.get("name") or pkg.get("pkgname") or ""
-            return str(pkg)
-
-        selected_pkgs = sorted(selected_pkgs, key=get_pkg_name)
-
-        selected_category_data = {
-            "name": "Selected Applications",
-            "description": "All applications you have selected so far.",
-            "icon": "emblem-ok-symbolic",
-            "packages": selected_pkgs,
-            "_is_selected_category": True,
-            "hidden": False,
-        }
-
-        # --- Add to self.groups for consistency ---
-        if not hasattr(self, "groups"):
-            self.groups = (
-                self.packages if isinstance(self.packages, list) else [self.packages]
-            )
-        # Remove previous selected category from groups if present
-        self.groups = [
-            g
-            for g in self.groups
-            if not (isinstance(g, dict) and g.get("_is_selected_category"))
-        ]
-        self.groups.insert(0, selected_category_data)
-
-        # --- Add to UI ---
-        self.remove_selected_applications_category()
-        selected_row = Gtk.ListBoxRow.new()
-        selected_row.group_data = selected_category_data
-        selected_row.group_key = "grp:selected"
-        selected_row.depth = 0
-        selected_row.is_selected_category = True
-        row_box = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, spacing=8)
-        row_box.set_margin_top(8)
-        row_box.set_margin_bottom(8)
-        row_box.set_margin_start(8)
-        row_box.set_margin_end(8)
-        icon = Gtk.Image.new_from_icon_name("emblem-ok-symbolic")
-        icon.set_icon_size(Gtk.IconSize.NORMAL)
-        row_box.append(icon)
-        label = Gtk.Label.new("Selected Applications")
-        label.set_halign(Gtk.Align.START)
-        label.set_hexpand(True)
-        row_box.append(label)
-        selected_row.set_child(row_box)
-        self.categories_list.insert(selected_row, 0)
-        # Do not select by default, just add to the list
-
-    def remove_selected_applications_category(self):
-        """Remove the Selected Applications category from the categories list if present"""
-        child = self.categories_list.get_first_child()
-        while child:
-            group_data = getattr(child, "group_data", None)
-            if isinstance(group_data, dict) and group_data.get("_is_selected_category"):
-                self.categories_list.remove(child)
-                break
-            child = child.get_next_sibling()
-
-    def update_selected_applications_category(self):
-        """Update the Selected Applications category if it exists, otherwise do nothing"""
-        child = self.categories_list.get_first_child()
-        while child:
-            group_data = getattr(child, "group_data", None)
-            if isinstance(group_data, dict) and group_data.get("_is_selected_category"):
-                self.show_selected_applications_category()
-                break
-            child = child.get_next_sibling()
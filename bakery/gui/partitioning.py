@@ -36,6 +36,11 @@ gi.require_version("Adw", "1")
 from gi.repository import Gtk, Adw, GLib  # type: ignore
 
 
+def prefetch() -> dict:
+    """Drive and partition lists for partitioning_screen, safe to run in a thread."""
+    return {"disks": list_drives(), "partitions": get_partitions()}
+
+
 @time_fn
 @Gtk.Template(resource_path="/org/bredos/bakery/ui/partitioning_screen.ui")
 class partitioning_screen(Adw.Bin):
@@ -59,9 +64,10 @@ class partitioning_screen(Adw.Bin):
     parts_group: Adw.PreferencesGroup = Gtk.Template.Child()
     refresh_parts: Gtk.Button = Gtk.Template.Child()
 
-    def __init__(self, window, **kwargs) -> None:
+    def __init__(self, window, prefetched=None, **kwargs) -> None:
         super().__init__(**kwargs)
         self.window = window
+        data = prefetched or prefetch()
         self.disk_list.connect("notify::selected-item", self.on_disk_selected)
         self.erase_all.connect("toggled", self.on_partitioning_type)
         self.manual_part.connect("toggled", self.on_partitioning_type)
@@ -83,6 +89,8 @@ class partitioning_screen(Adw.Bin):
         self.refresh_parts.connect("clicked", self.refresh_parts_clicked)
 
         self.selection = {}
+        self._valid_key = None
+        self._valid = False
 
         self.is_efi = check_efi()
         self.device = detect_device()
@@ -99,9 +107,9 @@ class partitioning_screen(Adw.Bin):
 
         self.disk_model = Gtk.StringList()
         self.disk_list.set_model(self.disk_model)
-        self.disks = list_drives()
+        self.disks = data["disks"]
         self.disk = list(self.disks.keys())[0]
-        self.all_partitions = get_partitions()
+        self.all_partitions = data["partitions"]
         for disk in self.disks:
             self.disk_model.append(disk + ": " + self.disks[disk])
         partition_table = check_partition_table(self.disk)
@@ -113,6 +121,21 @@ class partitioning_screen(Adw.Bin):
         self.populate_available_parts(self.partitions)
         self.populate_disk_preview(self.partitions)
 
+    def is_valid(self) -> bool:
+        """validate_selection, memoized on the selection it depends on."""
+        key = (
+            self.selected_mode_view,
+            self.selected_mode,
+            tuple((p, d["fs"], d["mp"]) for p, d in self.selection.items()),
+        )
+        if key != self._valid_key:
+            self._valid_key = key
+            self._valid = self.validate_selection()
+        return self._valid
+
+    def selection_changed(self) -> None:
+        self.window.validity_changed(self)
+
     def validate_selection(self) -> bool:
         # Need atleast 1 / that is either ext4 or btrfs
         # If also Need atleast 1 /boot/efi that is either fat32
@@ -172,12 +195,14 @@ class partitioning_screen(Adw.Bin):
         self.stack.set_visible_child_name("guided")
         self.manual_partitioning.set_visible(True)
         self.guided_partitioning.set_visible(False)
+        self.selection_changed()
 
     def on_manual_partitioning_clicked(self, button) -> None:
         self.selected_mode_view = "manual"
         self.stack.set_visible_child_name("manual")
         self.manual_partitioning.set_visible(False)
         self.guided_partitioning.set_visible(True)
+        self.selection_changed()
 
     @time_fn
     def populate_available_parts(self, partitions) -> None:
@@ -200,9 +225,11 @@ class partitioning_screen(Adw.Bin):
                     size,
                     self.selection,
                     self.available_parts_box,
+                    self.selection_changed,
                 )
                 self.available_parts_box.add(row)
         self.parts_group.add(self.available_parts_box)
+        self.selection_changed()
 
     @time_fn
     def populate_disk_preview(self, partitions, new=False) -> None:
@@ -396,6 +423,7 @@ class partitioning_screen(Adw.Bin):
 
     def set_mode(self, mode):
         self.selected_mode = mode
+        self.selection_changed()
         if self.selected_partition is not None:
             self.selected_partition.remove_css_class("selected")
         if mode == "erase_all":
@@ -467,6 +495,7 @@ class PartitionRow(Adw.ActionRow):
         size: int,
         selection: dict,
         available_parts_box,
+        on_changed=None,
         **kwargs,
     ):
         super().__init__(**kwargs)
@@ -509,6 +538,7 @@ class PartitionRow(Adw.ActionRow):
         box.append(fs_dropdown)
         box.append(mp_dropdown)
         self.add_suffix(box)
+        self.on_changed = on_changed
 
         mp_dropdown.connect("notify::selected-item", self.on_mp_changed)
         fs_dropdown.connect("notify::selected-item", self.on_fs_changed)
@@ -517,6 +547,8 @@ class PartitionRow(Adw.ActionRow):
         if not self.part_name in self.selection:
             self.selection[self.part_name] = {"fs": None, "mp": None}
         self.selection[self.part_name][key] = value
+        if self.on_changed is not None:
+            self.on_changed()
 
     def on_fs_changed(self, dropdown, *_):
         selected = dropdown.props.selected_item
@@ -17,10 +17,9 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from pytz import timezone
 from datetime import datetime
-from bakery import lp, lrun, _
-from bakery.network import geoip
+from bakery import lp, lrun, _, lazy_import
+from bakery.network import geoip_guess, geoip_lookup
 from bakery.timezone import tz_list
 from bredos.utilities import time_fn
 
@@ -33,6 +32,14 @@ gi.require_version("Adw", "1")
 from gi.repository import Gtk, Adw, GLib  # type: ignore
 
 
+zoneinfo = lazy_import("zoneinfo")
+
+
+def prefetch() -> dict:
+    """Timezone list for timezone_screen, safe to run in a thread."""
+    return {"tz_list": tz_list()}
+
+
 @time_fn
 @Gtk.Template(resource_path="/org/bredos/bakery/ui/timezone_screen.ui")
 class timezone_screen(Adw.Bin):
@@ -43,10 +50,11 @@ class timezone_screen(Adw.Bin):
     curr_time = Gtk.Template.Child()
     preview_row = Gtk.Template.Child()
 
-    def __init__(self, window, **kwargs) -> None:
+    def __init__(self, window, prefetched=None, **kwargs) -> None:
         super().__init__(**kwargs)
         self.window = window
-        self.tz_list = tz_list()
+        data = prefetched or prefetch()
+        self.tz_list = data["tz_list"]
         self.timezone = {}
         self.timezone["ntp"] = True
 
@@ -67,30 +75,40 @@ class timezone_screen(Adw.Bin):
         for item in list(self.tz_list.keys()):
             self.region_model.append(item)
 
-        # Set placeholder until geoip is fetched
-        self.change_regions_list(list(self.tz_list.keys())[0])
-        self.regions_list.set_selected(0)
-        self.select_zone(
-            list(self.tz_list.keys())[0], self.tz_list[list(self.tz_list.keys())[0]][0]
-        )
-
-        # Fetch geoip asynchronously
+        # Show the best offline guess now, upgrade it once GeoIP answers
+        locale = self.window.selected_locale()
+        self.apply_timezone(geoip_guess(locale))
+        # What was actually selected, the guess may not be in the list
+        self.guess = dict(self.timezone)
         threading.Thread(target=self._fetch_geoip, daemon=True).start()
 
     def _fetch_geoip(self):
-        current_timezone = geoip()
-        GLib.idle_add(self._apply_geoip, current_timezone)
+        current_timezone = geoip_lookup()
+        if current_timezone is not None:
+            GLib.idle_add(self._apply_geoip, current_timezone)
 
     def _apply_geoip(self, current_timezone):
-        self.timezone["region"] = current_timezone["region"]
-        self.timezone["zone"] = current_timezone["zone"]
-        self.change_regions_list(current_timezone["region"])
-        self.regions_list.set_selected(
-            list(self.tz_list.keys()).index(current_timezone["region"])
-        )
-        self.select_zone(current_timezone["region"], current_timezone["zone"])
+        # Leave it alone if the user already picked something else
+        if (
+            self.timezone.get("region") == self.guess["region"]
+            and self.timezone.get("zone") == self.guess["zone"]
+        ):
+            self.apply_timezone(current_timezone)
         return False  # Stop idle_add
 
+    def apply_timezone(self, current_timezone) -> None:
+        regions = list(self.tz_list.keys())
+        region = current_timezone["region"]
+        zone = current_timezone["zone"]
+        if region not in self.tz_list or zone not in self.tz_list[region]:
+            region = regions[0]
+            zone = self.tz_list[region][0]
+        self.timezone["region"] = region
+        self.timezone["zone"] = zone
+        self.change_regions_list(region)
+        self.regions_list.set_selected(regions.index(region))
+        self.select_zone(region, zone)
+
     def on_region_changed(self, dropdown, *_):
         selected = dropdown.props.selected_item
         if selected is not None:
@@ -117,8 +135,8 @@ class timezone_screen(Adw.Bin):
     def preview_timezone(self, region, zone) -> None:
         # timezone expects region/zone
         try:
-            tz = timezone(str(region + "/" + zone))
-        except:
+            tz = zoneinfo.ZoneInfo(region + "/" + zone)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
             tz = None
         if tz is not None:
             time = datetime.now(tz)
@@ -62,6 +62,43 @@ class user_screen(Adw.Bin):
         self.validate_uid(self.uid_row)
         self.user_info_is_visible = False
 
+        # Let the window know when the next button may need updating
+        self._valid_key = None
+        self._valid = False
+        for widget in (
+            self.fullname_entry,
+            self.user_entry,
+            self.hostname_entry,
+            self.pass_entry,
+            self.confirm_pass_entry,
+            self.uid_row,
+        ):
+            widget.connect("changed", self.on_input_changed)
+
+    def on_input_changed(self, widget):
+        self.window.validity_changed(self)
+
+    def is_valid(self) -> bool:
+        """If all fields are filled in correctly, memoized on their contents."""
+        key = (
+            self.fullname_entry.get_text(),
+            self.user_entry.get_text(),
+            self.hostname_entry.get_text(),
+            self.pass_entry.get_text(),
+            self.confirm_pass_entry.get_text(),
+            int(self.uid_row.get_value()),
+        )
+        if key != self._valid_key:
+            self._valid_key = key
+            self._valid = (
+                (self.get_username() is not None)
+                and (self.get_hostname() is not None)
+                and (self.get_password() is not None)
+                and (self.get_fullname() is not None)
+                and (self.validate_uid(self.uid_row) is not None)
+            )
+        return self._valid
+
     def on_fullname_changed(self, entry):
         fullname = entry.get_text()
         a = validate_fullname(fullname)
@@ -159,6 +196,9 @@ class user_screen(Adw.Bin):
         else:
             pass_text = self.pass_entry.get_text()
             confirm_pass_text = self.confirm_pass_entry.get_text()
+            # chpasswd takes one password per line
+            if "\r" in pass_text or "\n" in pass_text:
+                return None
             if pass_text == confirm_pass_text:
                 return pass_text
             else:
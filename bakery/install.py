@@ -20,6 +20,7 @@
 
 import os
 import platform
+import shlex
 import subprocess
 import tempfile
 from time import monotonic, sleep
@@ -35,6 +36,7 @@ from .iso import (
     run_chroot_cmd,
     unpack_sqfs,
 )
+from .firstboot import firstboot
 from .keyboard import kb_set
 from .locale import enable_locales, set_locale
 from .misc import is_sbc, copy_logs, populate_messages, st
@@ -42,7 +44,7 @@ from .packages import remove_packages
 from .partitioning import mount_all_partitions, partition_disk, unmount_all
 from .timezone import tz_ntp, tz_set
 from .tweaks import load_config
-from .validate import gidc, shells, uidc
+from .validate import account_index, gidc, shells, uidc
 
 
 _stimer = monotonic()
@@ -157,7 +159,14 @@ def adduser(
     groups: list,
     chroot: bool = False,
     mnt_dir: str = None,
+    root_password: str = None,
 ) -> None:
+    """
+    Create the user with its group, supplementary groups and home in one go.
+
+    The password, and root's if root_password is given, are set with a
+    single chpasswd in the same run.
+    """
     if isinstance(uid, int):
         uid = str(uid)
     elif not uid.isdigit():
@@ -168,39 +177,57 @@ def adduser(
         gid = str(gid)
     elif not gid.isdigit():
         raise TypeError("GID not a number!")
-    if shell not in shells():
+    # chpasswd reads user:password lines from stdin, split at the first ':'
+    for i in [password, root_password]:
+        if i is not None and any(c in i for c in "\r\n"):
+            raise TypeError("Passwords cannot contain line breaks!")
+    root = mnt_dir if chroot and mnt_dir is not None else "/"
+    if shell not in shells(root):
         raise OSError("Invalid shell")
-    if uidc(uid):
+    if uidc(uid, root):
         raise OSError("Used UID")
-    if gidc(gid):
+    if gidc(gid, root):
         raise OSError("Used GID")
-    lp("Making group " + username + " on gid " + gid)
+    known = account_index(root).groups
+    missing = [i for i in groups if i not in known]
+    if missing:
+        lp("Skipping missing groups: " + ", ".join(missing), mode="warn")
+    groups = [i for i in groups if i in known]
+
+    # One shell in the target does the whole job, passwords go through stdin
+    useradd = ["useradd", "-N", username, "-u", uid, "-g", gid, "-m", "-s", shell]
+    if groups:
+        useradd += ["-G", ",".join(groups)]
+    script = "\n".join(
+        [
+            # May silently fail, which is fine.
+            shlex.join(["groupadd", username, "-g", gid]) + " || true",
+            "set -e",
+            shlex.join(useradd),
+            "chpasswd",
+        ]
+    )
+    creds = username + ":" + password + "\n"
+    if root_password is not None:
+        creds += "root:" + root_password + "\n"
+    cmd = ["sh", "-c", script]
     if chroot:
-        run_chroot_cmd(mnt_dir, ["groupadd", username, "-g", gid])
-    else:
-        lrun(["groupadd", username, "-g", gid])  # May silently fail, which is fine.
+        cmd = ["arch-chroot", mnt_dir] + cmd
+    lp("Making group " + username + " on gid " + gid)
     lp("Adding user " + username + " on " + uid + ":" + gid + " with shell " + shell)
-    if chroot:
-        run_chroot_cmd(
-            mnt_dir,
-            [
-                "useradd",
-                "-N",
-                username,
-                "-u",
-                uid,
-                "-g",
-                gid,
-                "-m",
-                "-s",
-                shell,
-            ],
-        )
-    else:
-        lrun(["useradd", "-N", username, "-u", uid, "-g", gid, "-m", "-s", shell])
-    for i in groups:
-        groupadd(username, i, chroot, mnt_dir)
-    passwd(username, password, chroot, mnt_dir)
+    if groups:
+        lp("Adding " + username + " to groups " + ", ".join(groups))
+    lp("Setting user " + username + " password")
+    if root_password is not None:
+        lp("Setting user root password")
+    if dryrun:
+        lp("Would have run: " + str(cmd) + ", with the passwords via stdin.")
+        return
+    res = subprocess.run(cmd, input=creds, text=True, capture_output=True)
+    for line in (res.stdout + res.stderr).splitlines():
+        lp(line)
+    if res.returncode:
+        raise OSError("Could not create user " + username)
 
 
 def groupadd(
@@ -214,23 +241,6 @@ def groupadd(
         lrun(cmd)
 
 
-def passwd(
-    username: str, password: str, chroot: bool = False, mnt_dir: str = None
-) -> None:
-    lp("Setting user " + username + " password")
-    cmd = ["passwd", username]
-    if dryrun:
-        lp("Would have run: " + str(cmd) + ", with the password via stdin.")
-    elif dryrun and chroot:
-        lp("Would have run: " + str(cmd) + ", with the password via stdin in chroot")
-    elif chroot:
-        subprocess.run(
-            ["arch-chroot", mnt_dir] + cmd, input=f"{password}\n{password}", text=True
-        )
-    else:
-        subprocess.run(cmd, input=f"{password}\n{password}", text=True)
-
-
 def sudo_nopasswd(no_passwd: bool, chroot: bool = False, mnt_dir: str = None) -> None:
     if dryrun:
         lp("Would have set sudoers to " + str(not no_passwd))
@@ -548,9 +558,9 @@ def install(settings=None) -> int:
                 settings["user"]["gid"],
                 settings["user"]["shell"],
                 settings["user"]["groups"],
+                root_password=settings["user"]["password"],
             )
             sudo_nopasswd(settings["user"]["sudo_nopasswd"])
-            passwd("root", settings["user"]["password"])
             # ideally, we should have a way to check which DM/DE is installed
             if settings["user"]["autologin"]:
                 enable_autologin(
@@ -652,31 +662,42 @@ def install(settings=None) -> int:
                 st(8)  # Locale
                 reset_timer()
                 enable_locales([settings["locale"]], chroot=True, mnt_dir=mnt_dir)
-                set_locale(settings["locale"], chroot=True, mnt_dir=mnt_dir)
+                if config.use_firstboot:
+                    # Keyboard, timezone and hostname go in the same pass
+                    firstboot(
+                        settings["locale"],
+                        settings["layout"],
+                        settings["timezone"],
+                        settings["hostname"],
+                        mnt_dir,
+                    )
+                    tz_ntp(settings["timezone"]["ntp"], chroot=True, mnt_dir=mnt_dir)
+                else:
+                    set_locale(settings["locale"], chroot=True, mnt_dir=mnt_dir)
 
-                lp("Took {:.5f}".format(get_timer()))
-                st(9)  # keyboard
-                reset_timer()
+                    lp("Took {:.5f}".format(get_timer()))
+                    st(9)  # keyboard
+                    reset_timer()
 
-                kb_set(
-                    settings["layout"]["model"],
-                    settings["layout"]["layout"],
-                    settings["layout"]["variant"],
-                    chroot=True,
-                    mnt_dir=mnt_dir,
-                )
+                    kb_set(
+                        settings["layout"]["model"],
+                        settings["layout"]["layout"],
+                        settings["layout"]["variant"],
+                        chroot=True,
+                        mnt_dir=mnt_dir,
+                    )
 
-                lp("Took {:.5f}".format(get_timer()))
-                st(10)  # TZ
-                reset_timer()
+                    lp("Took {:.5f}".format(get_timer()))
+                    st(10)  # TZ
+                    reset_timer()
 
-                tz_set(
-                    settings["timezone"]["region"],
-                    settings["timezone"]["zone"],
-                    chroot=True,
-                    mnt_dir=mnt_dir,
-                )
-                tz_ntp(settings["timezone"]["ntp"], chroot=True, mnt_dir=mnt_dir)
+                    tz_set(
+                        settings["timezone"]["region"],
+                        settings["timezone"]["zone"],
+                        chroot=True,
+                        mnt_dir=mnt_dir,
+                    )
+                    tz_ntp(settings["timezone"]["ntp"], chroot=True, mnt_dir=mnt_dir)
 
                 lp("Took {:.5f}".format(get_timer()))
                 st(11)  # Configure users
@@ -691,14 +712,12 @@ def install(settings=None) -> int:
                     settings["user"]["groups"],
                     chroot=True,
                     mnt_dir=mnt_dir,
+                    root_password=settings["user"]["password"],
                 )
                 lp("sudo_nopasswd")
                 sudo_nopasswd(
                     settings["user"]["sudo_nopasswd"], chroot=True, mnt_dir=mnt_dir
                 )
-                passwd(
-                    "root", settings["user"]["password"], chroot=True, mnt_dir=mnt_dir
-                )
                 # ideally, we should have a way to check which DM/DE is installed
                 if settings["user"]["autologin"]:
                     enable_autologin(
@@ -713,11 +732,12 @@ def install(settings=None) -> int:
                         settings["user"]["username"], chroot=True, mnt_dir=mnt_dir
                     )
 
-                lp("Took {:.5f}".format(get_timer()))
-                st(12)  # Configure hostname
-                reset_timer()
+                if not config.use_firstboot:
+                    lp("Took {:.5f}".format(get_timer()))
+                    st(12)  # Configure hostname
+                    reset_timer()
 
-                set_hostname(settings["hostname"], chroot=True, mnt_dir=mnt_dir)
+                    set_hostname(settings["hostname"], chroot=True, mnt_dir=mnt_dir)
 
                 lp("Took {:.5f}".format(get_timer()))
                 st(13)  # finishing up
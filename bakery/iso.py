@@ -22,15 +22,51 @@ import platform
 import re
 import tempfile
 
-from bakery import lrun, lp, _, expected_to_fail
+from bakery import lrun, lp, _, dryrun, expected_to_fail
 from bredos.utilities import catch_exceptions
 from .partitioning import mount_partition
 
+live_pkg_cache = "/var/cache/pacman/pkg"
+# Where the live cache is exposed inside the target, relative to mnt_dir
+live_pkg_cache_mnt = "/var/cache/pacman/live"
+
 
 def run_chroot_cmd(work_dir: str, cmd: list, *args, **kwargs) -> None:
     lrun(["arch-chroot", work_dir] + cmd, *args, **kwargs)
 
 
+@catch_exceptions
+def share_pkg_cache(mnt_dir: str) -> None:
+    """
+    Expose the live ISO's package cache to the target as an extra cache.
+
+    The cache is bind mounted read-only at live_pkg_cache_mnt, which
+    pkg_cache_args() passes to pacman as a secondary --cachedir.
+    It is released together with the rest of the target by unmount_all.
+    """
+    if not os.path.isdir(live_pkg_cache):
+        return
+    mnt = mnt_dir + live_pkg_cache_mnt
+    if dryrun:
+        lp("Would have bind mounted live package cache to " + mnt)
+        return
+    os.makedirs(mnt, exist_ok=True)
+    lp("Bind mounting live package cache to " + mnt)
+    lrun(["mount", "--bind", "-o", "ro", live_pkg_cache, mnt])
+
+
+def pkg_cache_args(mnt_dir: str) -> list:
+    """
+    Extra pacman arguments for installing into mnt_dir.
+
+    The target cache stays first so downloads land in it, the live cache
+    is only searched for already existing packages.
+    """
+    if not os.path.ismount(mnt_dir + live_pkg_cache_mnt):
+        return []
+    return ["--cachedir", live_pkg_cache, "--cachedir", live_pkg_cache_mnt]
+
+
 @catch_exceptions
 def grub_install(mnt_dir: str, arch: str = "arm64-efi") -> None:
     lp("Installing GRUB for the " + arch + " platform")
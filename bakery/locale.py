@@ -17,10 +17,17 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import os
+import shlex
+import shutil
+import subprocess
+import threading
 from bredos.utilities import catch_exceptions
 from bakery import lrun, lp, _, dryrun
 from .iso import run_chroot_cmd
 
+LOCALE_ARCHIVE = "/usr/lib/locale/locale-archive"
+
 _langmap = {
     "aa": "Afar",
     "af": "Afrikaans",
@@ -176,64 +183,217 @@ _langmap = {
 }
 
 
+def is_locale_line(line: str) -> bool:
+    return not (
+        len(line) < 4
+        or (line[2] != "_" and line[3] != "_")
+        or "@" in line
+        or "UTF-8" not in line
+    )
+
+
+class LocaleCatalog:
+    """
+    Parsed /etc/locale.gen of one root.
+
+    The file is only parsed again when its mtime changes. Edits are applied
+    to the parsed lines and written back in a single rewrite.
+    """
+
+    def __init__(self, root: str = "/") -> None:
+        self.root = root
+        self.path = os.path.join(root, "etc/locale.gen")
+        self.mtime = None
+        self.lines = []
+        self.index = {}  # locale -> [line numbers]
+        self.enabled = set()
+        self.lock = threading.Lock()
+
+    def refresh(self) -> None:
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self.mtime:
+            return
+        with open(self.path) as localef:
+            self.lines = localef.read().split("\n")
+        self.index = {}
+        self.enabled = set()
+        for i, line in enumerate(self.lines):
+            if not is_locale_line(line):
+                continue
+            locale = line.replace("#", "").replace("  ", "")  # cleanup
+            self.index.setdefault(locale, []).append(i)
+            if line[0] != "#":
+                self.enabled.add(locale)
+        self.mtime = mtime
+
+    def locales(self, only_enabled: bool = False) -> set:
+        with self.lock:
+            self.refresh()
+            return set(self.enabled if only_enabled else self.index)
+
+    def apply(self, enable=(), disable=()) -> set:
+        """
+        Enable and disable locales with one rewrite of locale.gen.
+
+        Returns:
+            set: The locales that were enabled or disabled.
+        """
+        with self.lock:
+            self.refresh()
+            for locale in list(enable) + list(disable):
+                if locale not in self.index:
+                    raise OSError("Invalid locale: " + locale)
+            lines = list(self.lines)
+            added = set()
+            for locale in enable:
+                if locale in self.enabled:
+                    lp("Locale " + locale + " already enabled")
+                    continue
+                lp("Enabling locale: " + locale)
+                lines[self.index[locale][0]] = locale
+                added.add(locale)
+            removed = set()
+            for locale in disable:
+                if locale not in self.enabled or locale in added:
+                    continue
+                lp("Disabling locale: " + locale)
+                for i in self.index[locale]:
+                    if lines[i][0] != "#":
+                        lines[i] = "#" + lines[i]
+                removed.add(locale)
+            changed = added | removed
+            if not changed:
+                return changed
+            if dryrun:
+                lp("Would have rewritten " + self.path)
+                return changed
+            with open(self.path, "w") as localef:
+                localef.write("\n".join(lines))
+            self.mtime = None  # Parse our own write on next use
+            return changed
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def locale_catalog(chroot: bool = False, mnt_dir: str = None) -> LocaleCatalog:
+    """The LocaleCatalog of the host, or of mnt_dir when chroot is set."""
+    root = mnt_dir if chroot and mnt_dir is not None else "/"
+    with _catalogs_lock:
+        if root not in _catalogs:
+            _catalogs[root] = LocaleCatalog(root)
+        return _catalogs[root]
+
+
 @catch_exceptions
 def locales(
     only_enabled: bool = False, chroot: bool = False, mnt_dir: str = None
-) -> list:
+) -> set:
     """
     Returns all possible locales.
 
     Uses /etc/locale.gen since there is no standard on arm.
     """
+    return locale_catalog(chroot, mnt_dir).locales(only_enabled)
+
+
+def archive_name(locale: str) -> str:
+    """de_DE.UTF-8 UTF-8 -> de_DE.utf8, the way locale-archive lists it."""
+    name, charset = locale_source(locale)
+    base, modifier = (name.split("@", 1) + [""])[:2]
+    charset = charset.lower().replace("-", "")
+    return base + "." + charset + ("@" + modifier if modifier else "")
+
+
+def locale_source(locale: str) -> tuple:
+    """de_DE.UTF-8 UTF-8 -> (de_DE, UTF-8), the localedef -i and -f args."""
+    name, charset = (locale.split(" ", 1) + ["UTF-8"])[:2]
+    base, modifier = (name.split("@", 1) + [""])[:2]
+    base = base.split(".")[0]
+    return base + ("@" + modifier if modifier else ""), charset.strip()
+
+
+def archive_locales(archive: str) -> set:
+    """Names stored in a locale-archive, empty if it does not exist."""
+    if not os.path.isfile(archive):
+        return set()
+    try:
+        return set(
+            subprocess.check_output(["localedef", "--list-archive", archive])
+            .decode("UTF-8")
+            .split()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return set()
+
+
+@catch_exceptions
+def compile_locales(to_build: list, chroot: bool = False, mnt_dir: str = None) -> None:
+    """
+    Compile only the given locale.gen entries into locale-archive.
+
+    Entries already in the target's archive are skipped. A target without an
+    archive gets a copy of the live one when that already has everything.
+    The rest is built with localedef in parallel, one job per CPU, and added
+    in one go, all within a single shell.
+    """
+    root = mnt_dir if chroot and mnt_dir is not None else "/"
+    archive = os.path.join(root, LOCALE_ARCHIVE.lstrip("/"))
+    present = archive_locales(archive)
+    missing = [i for i in to_build if archive_name(i) not in present]
+    if not missing:
+        lp("Requested locales already compiled")
+        return
+
+    if chroot and not present:
+        live = archive_locales(LOCALE_ARCHIVE)
+        if all(archive_name(i) in live for i in missing):
+            lp("Reusing the live locale archive")
+            if not dryrun:
+                os.makedirs(os.path.dirname(archive), exist_ok=True)
+                shutil.copyfile(LOCALE_ARCHIVE, archive)
+            return
+
+    # A single shell does all of it, so chroot mode needs one arch-chroot.
+    # The staging dir is in /var/tmp, arch-chroot mounts a fresh tmpfs on /tmp.
+    build_dir = "/var/tmp/bakery-locales"
+    jobs = os.cpu_count() or 1
+    script = [
+        "set -e",
+        "trap " + shlex.quote("rm -rf " + build_dir) + " EXIT",
+        "mkdir -p " + build_dir,
+    ]
+    dirs = []
+    for i in range(0, len(missing), jobs):
+        script.append("pids=")
+        for locale in missing[i : i + jobs]:
+            src, charset = locale_source(locale)
+            out = build_dir + "/" + archive_name(locale)
+            dirs.append(out)
+            # Same flags as locale-gen
+            cmd = ["localedef", "--no-archive", "-i", src, "-c", "-f", charset]
+            cmd += ["-A", "/usr/share/locale/locale.alias", out]
+            script.append(shlex.join(cmd) + ' & pids="$pids $!"')
+        # Exit status 1 is warnings only, the locale was still written
+        script.append('for pid in $pids; do wait "$pid" || [ $? -eq 1 ]; done')
+    script.append(shlex.join(["localedef", "--add-to-archive", "--replace"] + dirs))
+
+    lp("Compiling locales: " + ", ".join(missing))
+    cmd = ["sh", "-c", "\n".join(script)]
     if chroot:
-        file = mnt_dir + "/etc/locale.gen"
+        run_chroot_cmd(mnt_dir, cmd)
     else:
-        file = "/etc/locale.gen"
-    with open(file) as localef:
-        data = localef.read().split("\n")
-        for i in range(len(data) - 1, -1, -1):
-            if (
-                len(data[i]) < 4
-                or (data[i][2] != "_" and data[i][3] != "_")
-                or (only_enabled and data[i][0] == "#")
-                or "@" in data[i]
-                or "UTF-8" not in data[i]
-            ):
-                data.pop(i)  # remove non-locale / disabled locale on only_enabled
-        for i in range(len(data)):
-            data[i] = data[i].replace("#", "").replace("  ", "")  # cleanup
-        return set(data)
+        lrun(cmd)
 
 
 @catch_exceptions
-def enable_locales(to_en: list, chroot: bool = False, mnt_dir: str = None) -> None:
-    to_add = set()
-    enabled = locales(True, chroot, mnt_dir)
-    all_loc = locales(chroot=chroot, mnt_dir=mnt_dir)
-    for locale in to_en:
-        if locale not in enabled:
-            if locale in all_loc:
-                to_add.add(locale)
-            else:
-                raise OSError("Invalid locale: " + locale)
-        else:
-            lp("Locale " + locale + " already enabled")
-    if len(to_add):
-        for i in to_add:  # Why fumble with stacked \\n? Just spam a bit.
-            lp("Enabling locale: " + i)
-            if chroot:
-                run_chroot_cmd(
-                    mnt_dir, ["bash", "-c", "echo " + i + ">> /etc/locale.gen"]
-                )
-            else:
-                lrun(["bash", "-c", "echo " + i + ">> /etc/locale.gen"])
-        lp("Generating locales")
-        if chroot:
-            run_chroot_cmd(mnt_dir, ["locale-gen"])
-        else:
-            lrun(["locale-gen"])
-    else:
-        lp("No locales were enabled, not regenerating locale database.")
+def enable_locales(
+    to_en: list, chroot: bool = False, mnt_dir: str = None, to_dis: list = None
+) -> None:
+    locale_catalog(chroot, mnt_dir).apply(to_en, to_dis or [])
+    lp("Generating locales")
+    compile_locales(to_en, chroot, mnt_dir)
 
 
 @catch_exceptions
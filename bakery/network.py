@@ -17,112 +17,284 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-from . import config
 from bredos.utilities import catch_exceptions
-import socket, requests
-from bakery import lrun, lp, _
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from bakery import lrun, lp, _, lazy_import
+from bakery.timezone import split_tz, tz_guess
 
 import gi
 
 gi.require_version("NM", "1.0")
-from gi.repository import NM
+from gi.repository import GLib
+
+NM = lazy_import("gi.repository.NM")
+requests = lazy_import("requests")
+
+
+PROBE_HOSTS = [
+    ("8.8.8.8", 53),
+    ("9.9.9.9", 53),
+    ("1.1.1.1", 53),
+    ("130.61.177.30", 443),
+]
+PROBE_TIMEOUT = 2  # seconds, per endpoint
+INTERNET_TTL = 5  # seconds an internet_up answer stays valid
+GEOIP_URL = "https://geoip.kde.org/v1/timezone"
+GEOIP_TIMEOUT = (2, 3)  # connect, read
 
 
 @catch_exceptions
-def test_up(hostport: tuple) -> bool:
+def test_up(hostport: tuple, timeout: float = PROBE_TIMEOUT) -> bool:
     if not networking_up():
         return False
     try:
-        socket.setdefaulttimeout(10)
-        socket.socket(socket.AF_INET, socket.SOCK_STREAM).connect(hostport)
-        return True
-    except:
+        with socket.create_connection(hostport, timeout=timeout):
+            return True
+    except OSError:
         return False
 
 
+class NetworkState:
+    """
+    One NetworkManager client per process, with its connectivity cached.
+
+    The client is created asynchronously on a private GLib main loop thread,
+    the cached state is refreshed from NM device signals there. Reading it is
+    cheap, callbacks registered with subscribe() run on that thread.
+    """
+
+    types = ("wifi", "ethernet")
+
+    def __init__(self) -> None:
+        self.client = None
+        self.state = {
+            "available": dict.fromkeys(self.types, False),
+            "connected": dict.fromkeys(self.types, False),
+            "network": None,  # UUID of the primary connection
+        }
+        self._ready = threading.Event()
+        self._subscribers = {}
+        self._next_id = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        ctx = GLib.MainContext.new()
+        ctx.push_thread_default()
+        NM.Client.new_async(None, self._on_client_ready, None)
+        GLib.MainLoop.new(ctx, False).run()
+
+    def _on_client_ready(self, source, result, data) -> None:
+        try:
+            self.client = NM.Client.new_finish(result)
+        except GLib.Error as e:
+            lp("Could not connect to NetworkManager: " + str(e), mode="warn")
+            self._ready.set()
+            return
+        self.client.connect("device-added", self._on_device_added)
+        self.client.connect("device-removed", self._on_device_changed)
+        self.client.connect("notify::nm-running", self._on_device_changed)
+        self.client.connect("notify::primary-connection", self._on_device_changed)
+        for device in self.client.get_devices():
+            device.connect("state-changed", self._on_device_changed)
+        self._refresh()
+        self._ready.set()
+
+    def _on_device_added(self, client, device) -> None:
+        device.connect("state-changed", self._on_device_changed)
+        self._refresh()
+
+    def _on_device_changed(self, *args) -> None:
+        self._refresh()
+
+    def _refresh(self) -> None:
+        available = dict.fromkeys(self.types, False)
+        connected = dict.fromkeys(self.types, False)
+        for device in self.client.get_devices():
+            kind = device.get_type_description()
+            if kind in available:
+                available[kind] = True
+                if device.get_state().value_nick == "activated":
+                    connected[kind] = True
+        primary = self.client.get_primary_connection()
+        state = {
+            "available": available,
+            "connected": connected,
+            "network": primary.get_uuid() if primary is not None else None,
+        }
+        if state == self.state:
+            return
+        self.state = state
+        for callback in list(self._subscribers.values()):
+            try:
+                callback(state)
+            except Exception as e:
+                lp("Network state subscriber failed: " + str(e), mode="warn")
+
+    def network_id(self) -> str | None:
+        """UUID of the primary connection, identifies the network we are on."""
+        return self.state["network"]
+
+    def wait(self, timeout: float = 5) -> dict:
+        """The current state, waiting for the client on first use."""
+        self._ready.wait(timeout)
+        return self.state
+
+    def subscribe(self, callback) -> int:
+        """Call callback(state) on every connectivity change, returns an id."""
+        self._next_id += 1
+        self._subscribers[self._next_id] = callback
+        return self._next_id
+
+    def unsubscribe(self, sub_id: int) -> None:
+        self._subscribers.pop(sub_id, None)
+
+
+_network_state = None
+_network_state_lock = threading.Lock()
+
+
+def network_state() -> NetworkState:
+    global _network_state
+    with _network_state_lock:
+        if _network_state is None:
+            _network_state = NetworkState()
+    return _network_state
+
+
 @catch_exceptions
 def networking_up() -> bool:
     # Tests if an interface is connected.
-    client = NM.Client.new(None)
-    devices = client.get_devices()
-    for device in devices:
-        if (
-            device.get_type_description() in ["wifi", "ethernet"]
-            and device.get_state().value_nick == "activated"
-        ):
-            return True
-    return False
+    return any(network_state().wait()["connected"].values())
+
+
+_internet = None  # (result, monotonic timestamp)
+_internet_lock = threading.Lock()
+_internet_sub = None
+
+
+def _invalidate_internet(state: dict) -> None:
+    global _internet
+    _internet = None
+
+
+def _probe_internet() -> bool:
+    """Races all PROBE_HOSTS, returning on the first one that answers."""
+    pool = ThreadPoolExecutor(max_workers=len(PROBE_HOSTS))
+    try:
+        probes = [pool.submit(test_up, i) for i in PROBE_HOSTS]
+        for probe in as_completed(probes):
+            if probe.result():
+                return True
+        return False
+    finally:
+        # Losing probes finish on their own within PROBE_TIMEOUT
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 @catch_exceptions
 def internet_up() -> bool:
-    res = False
-    for i in [
-        ("8.8.8.8", 53),
-        ("9.9.9.9", 53),
-        ("1.1.1.1", 53),
-        ("130.61.177.30", 443),
-    ]:
-        res = test_up(i)
-        if res:
-            break
+    global _internet, _internet_sub
+    with _internet_lock:
+        if _internet_sub is None:
+            _internet_sub = network_state().subscribe(_invalidate_internet)
+        cached = _internet
+        if cached is not None and time.monotonic() - cached[1] < INTERNET_TTL:
+            return cached[0]
+        res = networking_up() and _probe_internet()
+        _internet = (res, time.monotonic())
     lp("Internet status: " + str(res))
     return res
 
 
+def geoip_cache_path() -> str:
+    return os.path.join(GLib.get_user_cache_dir(), "bakery", "geoip.json")
+
+
+def _geoip_cache() -> dict:
+    try:
+        with open(geoip_cache_path()) as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _geoip_store(network: str, tz: dict) -> None:
+    cache = _geoip_cache()
+    cache[network] = tz
+    target = geoip_cache_path()
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + ".tmp", "w") as f:
+            json.dump(cache, f)
+        os.replace(target + ".tmp", target)
+    except OSError as e:
+        lp(f"Could not write the GeoIP cache: {e}", "warn")
+
+
 @catch_exceptions
-def geoip() -> dict:
+def geoip_lookup() -> dict | None:
+    """
+    Ask the GeoIP service, within GEOIP_TIMEOUT. Returns None when offline
+    or when the answer is unusable.
+    """
+    if not internet_up():
+        return None
     try:
-        if not internet_up():
-            raise OSError
-        tz_data = requests.get("https://geoip.kde.org/v1/timezone").json()
-        region, zone = tz_data["time_zone"].split("/")
-        return {"region": region, "zone": zone}
-    except:
-        return config.timezone
+        tz_data = requests.get(GEOIP_URL, timeout=GEOIP_TIMEOUT).json()
+        tz = split_tz(tz_data["time_zone"])
+    except (requests.RequestException, ValueError, KeyError, TypeError):
+        return None
+    if tz is None:
+        return None
+    network = network_state().network_id()
+    if network is not None:
+        _geoip_store(network, tz)
+    return tz
+
+
+@catch_exceptions
+def geoip_guess(locale: str = None) -> dict:
+    """
+    Best timezone guess without waiting on the network.
+
+    The last GeoIP answer for this network if there is one, the offline
+    guesses of tz_guess() otherwise.
+    """
+    network = network_state().network_id()
+    if network is not None:
+        tz = _geoip_cache().get(network)
+        if isinstance(tz, dict) and "region" in tz and "zone" in tz:
+            return tz
+    return tz_guess(locale)
+
+
+@catch_exceptions
+def geoip(locale: str = None) -> dict:
+    return geoip_lookup() or geoip_guess(locale)
 
 
 @catch_exceptions
 def ethernet_available() -> bool:
-    client = NM.Client.new(None)
-    devices = client.get_devices()
-    for device in devices:
-        if device.get_type_description() == "ethernet":
-            return True
-    return False
+    return network_state().wait()["available"]["ethernet"]
 
 
 @catch_exceptions
 def ethernet_connected() -> bool:
-    client = NM.Client.new(None)
-    devices = client.get_devices()
-    for device in devices:
-        if (
-            device.get_type_description() == "ethernet"
-            and device.get_state().value_nick == "activated"
-        ):
-            return True
-    return False
+    return network_state().wait()["connected"]["ethernet"]
 
 
 @catch_exceptions
 def wifi_available() -> bool:
-    client = NM.Client.new(None)
-    devices = client.get_devices()
-    for device in devices:
-        if device.get_type_description() == "wifi":
-            return True
-    return False
+    return network_state().wait()["available"]["wifi"]
 
 
 @catch_exceptions
 def wifi_connected() -> bool:
-    client = NM.Client.new(None)
-    devices = client.get_devices()
-    for device in devices:
-        if (
-            device.get_type_description() == "wifi"
-            and device.get_state().value_nick == "activated"
-        ):
-            return True
-    return False
+    return network_state().wait()["connected"]["wifi"]
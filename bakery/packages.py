@@ -17,15 +17,18 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import hashlib
+import marshal
 import os
 import subprocess
 from bredos.utilities import catch_exceptions
-import yaml
-from bakery import lrun, lp, expected_to_fail
+from bakery import lrun, lp, expected_to_fail, lazy_import
 from bakery.network import internet_up
-from .iso import run_chroot_cmd
+from .iso import pkg_cache_args, run_chroot_cmd
 import gi
-from gi.repository import Gio
+from gi.repository import Gio, GLib
+
+yaml = lazy_import("yaml")
 
 
 @catch_exceptions
@@ -37,12 +40,12 @@ def pacstrap(mnt_dir: str, packages: list) -> None:
 
 @catch_exceptions
 def install_packages(packages: list, chroot: bool = False, mnt_dir: str = None) -> None:
-    cmd = ["pacman", "-Sy", "--noconfirm"] + packages
+    cmd = ["pacman", "-Sy", "--noconfirm"]
     lp("Installing packages: " + " ".join(packages))
     if chroot and mnt_dir is not None:
-        run_chroot_cmd(mnt_dir, cmd)
+        run_chroot_cmd(mnt_dir, cmd + pkg_cache_args(mnt_dir) + packages)
     else:
-        lrun(cmd)
+        lrun(cmd + packages)
     lp("Package installation complete")
 
 
@@ -72,15 +75,45 @@ def ensure_localdb(retries: int = 3) -> None:
         raise OSError("Could not update databases.")
 
 
+_MARSHAL_MAGIC = b"BKRY"
+
+
+def _load_yaml_resource(name: str):
+    """
+    Loads a bundled YAML file, preferring its pre-parsed form.
+
+    The marshal blob is produced by data/compile_yaml.py at build time and is
+    only trusted when its embedded hash matches the bundled YAML.
+    """
+    raw = Gio.resources_lookup_data(f"/org/bredos/bakery/{name}.yaml", 0).get_data()
+    try:
+        blob = Gio.resources_lookup_data(
+            f"/org/bredos/bakery/{name}.marshal", 0
+        ).get_data()
+    except GLib.Error:
+        blob = b""
+    if (
+        len(blob) > 37
+        and blob[:4] == _MARSHAL_MAGIC
+        and blob[4] == marshal.version
+        and blob[5:37] == hashlib.sha256(raw).digest()
+    ):
+        try:
+            return marshal.loads(blob[37:])
+        except (EOFError, ValueError, TypeError):
+            pass
+    lp("No usable pre-parsed " + name + ", parsing YAML", mode="debug")
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(raw.decode("utf-8"), Loader=loader)
+
+
 @catch_exceptions
 def get_packages_list() -> dict:
     """
     Returns netinstall list of packages.
     """
 
-    data_bytes = Gio.resources_lookup_data("/org/bredos/bakery/packages.yaml", 0)
-
-    return yaml.safe_load(data_bytes.get_data().decode("utf-8"))
+    return _load_yaml_resource("packages")
 
 
 @catch_exceptions
@@ -89,9 +122,7 @@ def get_desktops_list() -> dict:
     Returns desktop list of packages.
     """
 
-    data_bytes = Gio.resources_lookup_data("/org/bredos/bakery/desktops.yaml", 0)
-
-    return yaml.safe_load(data_bytes.get_data().decode("utf-8"))
+    return _load_yaml_resource("desktops")
 
 
 @catch_exceptions
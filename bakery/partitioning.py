@@ -22,9 +22,10 @@ import subprocess
 import tempfile
 from time import sleep
 from bredos.utilities import catch_exceptions
-import psutil
-from bakery import lrun, lp
-import parted
+from bakery import lrun, lp, lazy_import
+
+psutil = lazy_import("psutil")
+parted = lazy_import("parted")
 
 
 def check_efi() -> bool:
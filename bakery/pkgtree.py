@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+#
+# Copyright 2025 BredOS
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import platform
+from array import array
+from collections import deque
+
+GROUP = 0
+PACKAGE = 1
+UNDO_LIMIT = 100  # undo steps kept by a Selection
+
+
+def is_valid_group(data) -> bool:
+    return isinstance(data, dict) and bool(data.get("name"))
+
+
+def is_valid_package(data) -> bool:
+    if isinstance(data, str):
+        return True
+    return isinstance(data, dict) and bool(data.get("name"))
+
+
+def is_arch_compatible(data, arch: str) -> bool:
+    if not isinstance(data, dict):
+        return True  # String packages have no arch restrictions
+    required = data.get("arch")
+    if not required:
+        return True
+    if isinstance(required, str):
+        required = [required]
+    return arch in required
+
+
+class PackageTree:
+    """
+    Flattened, pre-order view of the netinstall package tree.
+
+    Every node attribute lives in a parallel array indexed by node number.
+    A group's packages come right after it, followed by its subgroups, so the
+    subtree of node i is always the slice [i, end[i]).
+    """
+
+    def __init__(self, groups, arch: str = None) -> None:
+        self.arch = arch if arch is not None else platform.machine()
+        self.kind = bytearray()
+        self.parent = array("i")
+        self.end = array("i")
+        self.depth = bytearray()
+        self.arch_ok = bytearray()
+        self.default = 0  # bitset of the nodes selected by default
+        self.key = []
+        self.name = []
+        self.data = []
+        self.index = {}  # key -> node
+        self.by_name = {}  # package name -> [nodes]
+        self.roots = []
+
+        if not isinstance(groups, list):
+            groups = [groups] if groups else []
+        for grp in groups:
+            if is_valid_group(grp):
+                self.roots.append(self._add_group(grp, [], -1, True, False))
+
+        # Bitsets matching the per-node flags, for masking selections
+        self.arch_mask = self.mask(i for i in range(len(self)) if self.arch_ok[i])
+        self.package_mask = self.mask(
+            i for i in range(len(self)) if self.kind[i] == PACKAGE
+        )
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    def _push(self, kind, parent, key, name, data, ok, selected) -> int:
+        i = len(self.kind)
+        self.kind.append(kind)
+        self.parent.append(parent)
+        self.end.append(i + 1)
+        self.depth.append(0 if parent < 0 else self.depth[parent] + 1)
+        self.arch_ok.append(ok)
+        if selected:
+            self.default |= 1 << i
+        self.key.append(key)
+        self.name.append(name)
+        self.data.append(data)
+        self.index[key] = i
+        return i
+
+    def _add_group(self, grp, path, parent, parent_ok, parent_selected) -> int:
+        name = grp["name"]
+        path = path + [name]
+        ok = parent_ok and is_arch_compatible(grp, self.arch)
+        selected = grp.get("selected", parent_selected)
+        group_key = "grp:" + "/".join(path)
+        i = self._push(GROUP, parent, group_key, name, grp, ok, ok and selected)
+
+        for pkg in grp.get("packages") or []:
+            if not is_valid_package(pkg):
+                continue
+            if isinstance(pkg, dict):
+                pkg_name = pkg["name"]
+                pkg_selected = pkg.get("selected", selected)
+            else:
+                pkg_name = pkg
+                pkg_selected = selected
+            pkg_ok = ok and is_arch_compatible(pkg, self.arch)
+            j = self._push(
+                PACKAGE,
+                i,
+                "pkg:" + group_key + "/" + pkg_name,
+                pkg_name,
+                pkg,
+                pkg_ok,
+                pkg_ok and pkg_selected,
+            )
+            self.by_name.setdefault(pkg_name, []).append(j)
+
+        for sg in grp.get("subgroups") or []:
+            if is_valid_group(sg):
+                self._add_group(sg, path, i, ok, selected)
+
+        self.end[i] = len(self.kind)
+        return i
+
+    @staticmethod
+    def mask(nodes) -> int:
+        """Bitset with the bits of nodes set."""
+        bits = 0
+        for i in nodes:
+            bits |= 1 << i
+        return bits
+
+    def children(self, i: int):
+        """Direct children of group i, skipping over their subtrees."""
+        j = i + 1
+        end = self.end[i]
+        while j < end:
+            yield j
+            j = self.end[j]
+
+    def packages(self, i: int) -> list:
+        """Arch compatible packages directly inside group i."""
+        return [
+            j for j in self.children(i) if self.kind[j] == PACKAGE and self.arch_ok[j]
+        ]
+
+    def subgroups(self, i: int) -> list:
+        """Arch compatible subgroups directly inside group i."""
+        return [
+            j for j in self.children(i) if self.kind[j] == GROUP and self.arch_ok[j]
+        ]
+
+    def attr(self, i: int, name: str, default=None):
+        data = self.data[i]
+        return data.get(name, default) if isinstance(data, dict) else default
+
+    def immutable(self, i: int) -> bool:
+        return bool(self.attr(i, "immutable") or self.attr(i, "critical"))
+
+    def group_ranges(self, i: int) -> list:
+        """
+        Slices covering what activating group i selects.
+
+        That is its whole subtree, minus the subgroups explicitly marked
+        selected: false, which stay as they are.
+        """
+        ranges = []
+        start = i
+        j = i + 1
+        end = self.end[i]
+        while j < end:
+            if self.kind[j] == GROUP and self.attr(j, "selected") is False:
+                ranges.append((start, j))
+                start = self.end[j]
+                j = start
+            else:
+                j += 1
+        ranges.append((start, end))
+        return [(a, b) for a, b in ranges if a < b]
+
+    def collect(self, selected: int) -> tuple:
+        """
+        Packages and post-install scripts for a selection bitset.
+
+        Only the set bits are visited.
+
+        Returns:
+            tuple: (package names, post-install scripts), both deduplicated.
+        """
+        packages = {}
+        scripts = {}
+        for i in iter_bits(selected & self.arch_mask):
+            if self.kind[i] == PACKAGE:
+                packages[self.name[i]] = None
+            script = self.attr(i, "post-install")
+            if script:
+                scripts[script] = None
+        return list(packages), list(scripts)
+
+
+def iter_bits(bits: int):
+    """Indices of the set bits, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class Selection:
+    """
+    Selection state over a PackageTree, stored as a bitset in tree order.
+
+    Subtrees are contiguous in the tree, so toggling one is a single mask
+    operation. Packages that are not part of the tree (AppStream results)
+    are kept in extra, keyed by their package key.
+    Snapshots are plain tuples, which makes undo and reset cheap. Only the
+    last UNDO_LIMIT of them are kept.
+    """
+
+    def __init__(self, tree: PackageTree) -> None:
+        self.tree = tree
+        self.bits = tree.default
+        self.extra = {}
+        self.history = deque(maxlen=UNDO_LIMIT)
+
+    def __getitem__(self, i: int) -> bool:
+        return bool(self.bits >> i & 1)
+
+    def set(self, i: int, value: bool) -> None:
+        if value:
+            self.bits |= 1 << i
+        else:
+            self.bits &= ~(1 << i)
+
+    def set_range(self, start: int, end: int, value: bool) -> None:
+        rng = ((1 << (end - start)) - 1) << start
+        if value:
+            self.bits |= rng
+        else:
+            self.bits &= ~rng
+
+    def set_nodes(self, nodes, value: bool) -> None:
+        m = self.tree.mask(nodes)
+        if value:
+            self.bits |= m
+        else:
+            self.bits &= ~m
+
+    def selected_packages(self) -> list:
+        """Selected, arch compatible package nodes in tree order."""
+        tree = self.tree
+        return list(iter_bits(self.bits & tree.arch_mask & tree.package_mask))
+
+    def snapshot(self) -> tuple:
+        return self.bits, dict(self.extra)
+
+    def restore(self, snap: tuple) -> None:
+        self.bits, extra = snap
+        self.extra = dict(extra)
+
+    def record(self, before: tuple) -> None:
+        """Make before an undo step, unless nothing changed since."""
+        if self.snapshot() != before:
+            self.history.append(before)
+
+    def undo(self) -> bool:
+        """Return to the last checkpoint. Returns False if there is none."""
+        if not self.history:
+            return False
+        self.restore(self.history.pop())
+        return True
+
+    def reset(self) -> None:
+        before = self.snapshot()
+        self.bits = self.tree.default
+        self.extra = {}
+        self.record(before)
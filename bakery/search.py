@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+#
+# Copyright 2025 BredOS
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from array import array
+
+
+def trigrams(text: str) -> set:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Inverted trigram index over documents made of several text fields.
+
+    Fields are given in order of importance, earlier fields rank higher.
+    Queries of three characters or more are answered by intersecting the
+    postings of their trigrams and confirming the candidates, shorter ones
+    fall back to a substring scan over the pre-lowered fields.
+    """
+
+    def __init__(self) -> None:
+        self.ids = []  # document position -> caller supplied id
+        self.fields = []  # document position -> tuple of lowered fields
+        self.postings = {}  # trigram -> array of document positions
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, doc_id, *fields) -> None:
+        pos = len(self.ids)
+        lowered = tuple((f or "").lower() for f in fields)
+        self.ids.append(doc_id)
+        self.fields.append(lowered)
+        grams = set()
+        for f in lowered:
+            grams |= trigrams(f)
+        for gram in grams:
+            postings = self.postings.get(gram)
+            if postings is None:
+                postings = self.postings[gram] = array("i")
+            postings.append(pos)
+
+    def dump(self) -> tuple:
+        """Plain data form of the index, suitable for marshal."""
+        return (
+            self.ids,
+            self.fields,
+            {gram: postings.tobytes() for gram, postings in self.postings.items()},
+        )
+
+    @classmethod
+    def load(cls, data: tuple):
+        """Rebuild an index from the output of dump()."""
+        index = cls()
+        index.ids, fields, postings = data
+        index.fields = [tuple(f) for f in fields]
+        for gram, raw in postings.items():
+            index.postings[gram] = array("i")
+            index.postings[gram].frombytes(raw)
+        return index
+
+    def _candidates(self, query: str):
+        grams = trigrams(query)
+        if not grams:
+            return range(len(self.ids))
+        lists = []
+        for gram in grams:
+            postings = self.postings.get(gram)
+            if postings is None:
+                return ()
+            lists.append(postings)
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for postings in lists[1:]:
+            candidates.intersection_update(postings)
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, query: str, limit: int = None) -> list:
+        """
+        Ids of the documents containing query, best match first.
+
+        Matches are ranked by the first field they occur in, then by how
+        early in that field, then by insertion order.
+        """
+        query = query.lower().strip()
+        if not query:
+            return []
+        ranked = []
+        for pos in self._candidates(query):
+            for field, text in enumerate(self.fields[pos]):
+                at = text.find(query)
+                if at >= 0:
+                    ranked.append((field, at, pos))
+                    break
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self.ids[pos] for _, _, pos in ranked]
@@ -17,33 +17,128 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
-import subprocess
+import os
+import threading
+import time
+from datetime import datetime
 from bredos.utilities import catch_exceptions
-from bakery import lrun, lp
+from bakery import config, lrun, lp, lazy_import
 from .iso import run_chroot_cmd
 
+zoneinfo = lazy_import("zoneinfo")
+
+ZONEINFO_DIR = "/usr/share/zoneinfo"
+RTC_EPOCH = "/sys/class/rtc/rtc0/since_epoch"
+
+
+def parse_coords(coords: str) -> tuple:
+    """ISO 6709 +DDMM[SS]+DDDMM[SS] -> (latitude, longitude) in degrees."""
+    split = max(coords.rfind("+"), coords.rfind("-"))
+    res = []
+    for part, deg_len in ((coords[:split], 2), (coords[split:], 3)):
+        sign = -1 if part[0] == "-" else 1
+        digits = part[1:]
+        value = int(digits[:deg_len]) + int(digits[deg_len : deg_len + 2]) / 60
+        if len(digits) > deg_len + 2:
+            value += int(digits[deg_len + 2 :]) / 3600
+        res.append(sign * value)
+    return tuple(res)
+
+
+class TimezoneIndex:
+    """
+    Timezones known to one root, read from its tzdata.zi and zone tables.
+
+    Only parsed again when tzdata.zi changes.
+    """
+
+    def __init__(self, root: str = "/") -> None:
+        self.root = root
+        self.dir = os.path.join(root, ZONEINFO_DIR.lstrip("/"))
+        self.mtime = None
+        self.names = set()
+        self.regions = {}  # region -> [zones]
+        self.coords = {}  # name -> (latitude, longitude)
+        self.countries = {}  # name -> [country codes]
+        self.country_zones = {}  # country code -> [names]
+        self.lock = threading.Lock()
+
+    def refresh(self) -> None:
+        mtime = os.stat(os.path.join(self.dir, "tzdata.zi")).st_mtime_ns
+        if mtime == self.mtime:
+            return
+        names = set()
+        with open(os.path.join(self.dir, "tzdata.zi")) as f:
+            for line in f:
+                # Z name ..., L target name
+                if line.startswith("Z "):
+                    names.add(line.split()[1])
+                elif line.startswith("L "):
+                    names.add(line.split()[2])
+        regions = {}
+        for name in sorted(names):
+            if "/" in name:
+                region, zone = name.split("/", 1)
+                regions.setdefault(region, []).append(zone)
+
+        coords = {}
+        countries = {}
+        for row in self._table("zone1970.tab"):
+            countries[row[2]] = row[0].split(",")
+            coords[row[2]] = parse_coords(row[1])
+        country_zones = {}
+        for row in self._table("zone.tab"):
+            country_zones.setdefault(row[0], []).append(row[2])
+            coords.setdefault(row[2], parse_coords(row[1]))
+            countries.setdefault(row[2], [row[0]])
+
+        self.names = names
+        self.regions = regions
+        self.coords = coords
+        self.countries = countries
+        self.country_zones = country_zones
+        self.mtime = mtime
+
+    def _table(self, name: str) -> list:
+        try:
+            with open(os.path.join(self.dir, name)) as f:
+                return [
+                    line.rstrip("\n").split("\t")
+                    for line in f
+                    if not line.startswith("#") and line.count("\t") >= 2
+                ]
+        except OSError:
+            return []
+
+    def get(self) -> "TimezoneIndex":
+        """This index, refreshed if tzdata changed."""
+        with self.lock:
+            self.refresh()
+        return self
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def tz_index(chroot: bool = False, mnt_dir: str = None) -> TimezoneIndex:
+    """The TimezoneIndex of the host, or of mnt_dir when chroot is set."""
+    root = mnt_dir if chroot and mnt_dir is not None else "/"
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = TimezoneIndex(root)
+        index = _indexes[root]
+    return index.get()
+
 
 @catch_exceptions
-def tz_list() -> dict:
-    res = {}
-    data = (
-        subprocess.check_output(["timedatectl", "list-timezones"])
-        .decode("UTF-8")
-        .split()
-    )
-    for i in data:
-        if "/" in i:
-            cont = i[: i.find("/")]
-            if cont not in res.keys():
-                res[cont] = []
-            res[cont].append(i[i.find("/") + 1 :])
-    return res
+def tz_list(chroot: bool = False, mnt_dir: str = None) -> dict:
+    return tz_index(chroot, mnt_dir).regions
 
 
 @catch_exceptions
 def tz_set(region: str, zone: str, chroot: bool = False, mnt_dir: str = None) -> None:
-    tzs = tz_list()
-    if region in tzs.keys() and zone in tzs[region]:
+    if region + "/" + zone in tz_index(chroot, mnt_dir).names:
         if chroot:
             # in chroot use symlink
             lrun(
@@ -68,3 +163,84 @@ def tz_ntp(ntp: bool, chroot: bool = False, mnt_dir: str = None) -> None:
         run_chroot_cmd(mnt_dir, ["systemctl", "enable", "systemd-timesyncd"])
     else:
         lrun(["timedatectl", "set-ntp", str(int(ntp))])
+
+
+def split_tz(name: str) -> dict | None:
+    """Europe/London -> {"region": "Europe", "zone": "London"}"""
+    if not name or "/" not in name:
+        return None
+    region, zone = name.split("/", 1)
+    return {"region": region, "zone": zone}
+
+
+def localtime_tz(root: str = "/") -> str | None:
+    """The timezone /etc/localtime points to, unless it is a fixed offset."""
+    try:
+        target = os.readlink(os.path.join(root, "etc/localtime"))
+    except OSError:
+        return None
+    i = target.find("zoneinfo/")
+    if i < 0:
+        return None
+    name = target[i + len("zoneinfo/") :]
+    if "/" not in name or name.startswith(("Etc/", "posix/", "right/")):
+        return None
+    return name
+
+
+def rtc_offset() -> int | None:
+    """
+    Seconds the RTC is ahead of the system clock, rounded to 15 minutes.
+
+    A non zero offset usually means the RTC keeps local time (dual boot with
+    Windows), which hints at the local UTC offset.
+    """
+    try:
+        with open(RTC_EPOCH) as f:
+            offset = int(f.read()) - time.time()
+    except (OSError, ValueError):
+        return None
+    offset = round(offset / 900) * 900
+    if not offset or abs(offset) > 14 * 3600:
+        return None
+    return offset
+
+
+def locale_territory(locale: str) -> str | None:
+    """en_US.UTF-8 or "en_US UTF-8" -> US"""
+    if not locale:
+        return None
+    name = locale.split(" ")[0].split(".")[0].split("@")[0]
+    if "_" not in name:
+        return None
+    return name.split("_", 1)[1].upper()
+
+
+def zone_offset(name: str) -> int | None:
+    try:
+        return int(datetime.now(zoneinfo.ZoneInfo(name)).utcoffset().total_seconds())
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError, OSError):
+        return None
+
+
+@catch_exceptions
+def tz_guess(locale: str = None) -> dict:
+    """
+    Best offline timezone guess.
+
+    Tries /etc/localtime, then the zones of the locale's territory and the
+    RTC offset, then config.timezone. Does not touch the network.
+    """
+    name = localtime_tz()
+    if name is None:
+        zones = tz_index().country_zones
+        territory = locale_territory(locale)
+        candidates = zones.get(territory, []) if territory else []
+        offset = rtc_offset()
+        if offset is not None:
+            pool = candidates or [z for i in zones.values() for z in i]
+            matching = [z for z in pool if zone_offset(z) == offset]
+            candidates = matching or candidates
+        if candidates:
+            name = candidates[0]
+    return split_tz(name) or dict(config.timezone)
@@ -1,13 +1,15 @@
-import os, sys, time, curses, pwd, parted
-import argparse, signal, re, json
+import os, sys, time, curses, pwd
+import argparse, signal, re, json, threading
+from collections import deque
+from itertools import islice
 import subprocess
 from bakery import config
-from bakery import lp, lrun, dryrun
+from bakery import lp, lrun, dryrun, lazy_import, log_file
 from bakery.misc import detect_install_source, reboot
 from bakery.locale import langs
 from bakery.keyboard import kb_layouts, kb_models, kb_variants
 from bakery.timezone import tz_list
-from bakery.network import geoip
+from bakery.network import geoip_guess, geoip_lookup
 from bakery.partitioning import (
     get_partitions,
     check_efi,
@@ -15,19 +17,21 @@ from bakery.partitioning import (
 )
 
 from time import sleep
-from pytz import timezone
 from datetime import datetime
-from babel import dates, numbers
 from bredos import curseapp as c
 from bredos.logging import setup_handler
 from bredos.utilities import detect_device, detect_session_configuration
-from babel import Locale as bLocale
 from pyrunning import LoggingLevel
 
+parted = lazy_import("parted")
+
 
 c.APP_NAME = "Bakery"
 DRYRUN = dryrun
-LOGS = []
+# Only the most recent records are kept in memory, the full log is on disk.
+LOG_CAPACITY = 2000
+LOGS = deque(maxlen=LOG_CAPACITY)  # (level, timestamp, message)
+LOG_PAGE_SIZE = 100  # records shown at once by dump_logs
 SIDEBAR = {
     "Welcome": False,
     "Locale": False,
@@ -76,8 +80,24 @@ def console_logging(
     loginfo_stack_info=None,
     **kwargs,
 ) -> None:
-    logging_level_name = LoggingLevel(logging_level).name
-    LOGS.append(colors[logging_level_name] + message + RESET)
+    LOGS.append((logging_level, time.time(), message))
+
+
+def render_log(record: tuple) -> str:
+    logging_level, timestamp, message = record
+    return "".join(
+        (
+            colors[LoggingLevel(logging_level).name],
+            time.strftime("%H:%M:%S ", time.localtime(timestamp)),
+            message,
+            RESET,
+        )
+    )
+
+
+def log_page(start: int, count: int) -> list:
+    """Rendered log records [start, start + count) of the in memory log."""
+    return [render_log(i) for i in islice(LOGS, start, start + count)]
 
 
 setup_handler(console_logging)
@@ -92,8 +112,20 @@ signal.signal(signal.SIGTSTP, handle_stupid)
 
 
 def dump_logs() -> None:
+    """Show the in memory log one page at a time, oldest first."""
     lp("test")
-    c.message(LOGS, "logs dump")
+    pages = max(1, -(-len(LOGS) // LOG_PAGE_SIZE))
+    for page in range(pages):
+        lines = log_page(page * LOG_PAGE_SIZE, LOG_PAGE_SIZE)
+        if page + 1 == pages:
+            lines.append("Full log: " + log_file)
+            c.message(lines, f"logs dump ({page + 1}/{pages})")
+        elif not c.confirm(
+            [f"Logs, page {page + 1} of {pages}", ""]
+            + lines
+            + ["", "Press Y and Enter for the next page."]
+        ):
+            break
 
 
 def device_size(dev_path: str) -> int:
@@ -174,7 +206,7 @@ def keyboard_menu() -> dict | None:
                 kb_prettylayouts_keys,
                 False,
                 "Keyboard: Choose Layout",
-                preselect=kb_prettylayouts_keys.index("American English"),
+                preselect=kb_prettylayouts_keys.index(kb_layouts()["us"]),
                 sidebar=sidebar,
             )
 
@@ -236,12 +268,33 @@ def keyboard_menu() -> dict | None:
             break
 
 
-def timezone_menu() -> dict | None:
+GEOIP_WAIT = 0.4  # seconds timezone_menu waits for a pending GeoIP answer
+_geoip = {}
+_geoip_thread = None
+
+
+def start_geoip() -> None:
+    """Start the GeoIP lookup in the background, timezone_menu uses it if ready."""
+    global _geoip_thread
+    if _geoip_thread is None:
+        _geoip_thread = threading.Thread(
+            target=lambda: _geoip.update(timezone=geoip_lookup()), daemon=True
+        )
+        _geoip_thread.start()
+
+
+def timezone_menu(locale: str = None) -> dict | None:
     c.suspend()
     timezones = tz_list()
-    current_timezone = geoip()
+    start_geoip()
+    _geoip_thread.join(GEOIP_WAIT)
+    current_timezone = _geoip.get("timezone") or geoip_guess(locale)
+    if (
+        current_timezone["region"] not in timezones
+        or current_timezone["zone"] not in timezones[current_timezone["region"]]
+    ):
+        current_timezone = config.timezone
     regions = sorted(list(timezones.keys()))
-    sleep(0.4)
     c.resume()
 
     sidebar = SIDEBAR.copy()
@@ -528,7 +581,9 @@ def user_menu() -> None:
         )
 
     def PasswordConstraint(inp: str) -> bool:
-        return isinstance(inp, str) and len(inp) >= 4
+        return (
+            isinstance(inp, str) and len(inp) >= 4 and not any(c in inp for c in "\r\n")
+        )
 
     def UIDConstraint(inp: str) -> bool:
         if (not inp) and not isinstance(inp, str) or not inp.isdigit():
@@ -754,6 +809,7 @@ def install(manifest: dict) -> bool:
 
 def main_menu() -> None:
     c.init()
+    start_geoip()  # Usually answered by the time the timezone menu is up
     stage = 0
     locale = None
     keyboard = None
@@ -789,7 +845,7 @@ def main_menu() -> None:
                 keyboard = keyboard_menu()
                 stage = 1 if keyboard is None else 3
             elif stage == 3:
-                timezone = timezone_menu()
+                timezone = timezone_menu(locale)
                 stage = 2 if timezone is None else 4
             elif stage == 4:
                 if INSTALL_TYPE == "from_iso" or True:
@@ -19,8 +19,10 @@
 
 import os
 import re
-import yaml
 from bredos.utilities import catch_exceptions
+from bakery import lazy_import
+
+yaml = lazy_import("yaml")
 
 
 @catch_exceptions
@@ -17,7 +17,12 @@
 #
 # SPDX-License-Identifier: GPL-3.0-or-later
 
+import os
+import threading
+from functools import lru_cache
 
+
+@lru_cache(maxsize=64)
 def validate_username(username) -> str:
     if len(username) > 30:
         return "Cannot be longer than 30 characters"
@@ -38,6 +43,7 @@ def validate_username(username) -> str:
     return ""
 
 
+@lru_cache(maxsize=64)
 def validate_fullname(fullname) -> str:
     if len(fullname) > 30:
         return "Cannot be longer than 30 characters"
@@ -55,6 +61,7 @@ def validate_fullname(fullname) -> str:
     return ""
 
 
+@lru_cache(maxsize=64)
 def validate_hostname(hostname) -> str:
     if len(hostname) > 63:
         return "Cannot be longer than 30 characters"
@@ -79,47 +86,98 @@ def validate_hostname(hostname) -> str:
 # User configuration functions.
 
 
-def gidc(gid) -> bool:
+class AccountIndex:
+    """
+    Users, groups and login shells of one root.
+
+    Loaded from etc/passwd, etc/group and etc/shells, and only read again
+    when one of their mtimes changes.
+    """
+
+    files = ("passwd", "group", "shells")
+
+    def __init__(self, root: str = "/") -> None:
+        self.root = root
+        self.key = None
+        self.users = {}  # name -> uid
+        self.uids = set()
+        self.groups = {}  # name -> gid
+        self.gids = set()
+        self.shells = set()
+        self.lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, "etc", name)
+
+    def _read(self, name: str) -> list:
+        try:
+            with open(self._path(name)) as f:
+                return f.read().split("\n")
+        except FileNotFoundError:
+            return []
+
+    def _mtime(self, name: str):
+        try:
+            return os.stat(self._path(name)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def get(self) -> "AccountIndex":
+        """This index, reloaded if any of its files changed."""
+        with self.lock:
+            key = tuple(self._mtime(i) for i in self.files)
+            if key != self.key:
+                self._load()
+                self.key = key
+        return self
+
+    def _load(self) -> None:
+        self.users = {}
+        for i in self._read("passwd"):
+            fields = i.split(":")
+            if len(fields) > 2:
+                self.users[fields[0]] = fields[2]
+        self.groups = {}
+        for i in self._read("group"):
+            fields = i.split(":")
+            if len(fields) > 2:
+                self.groups[fields[0]] = fields[2]
+        self.uids = set(self.users.values())
+        self.gids = set(self.groups.values())
+        self.shells = {i for i in self._read("shells") if i.startswith("/")}
+
+
+_accounts = {}
+_accounts_lock = threading.Lock()
+
+
+def account_index(root: str = "/") -> AccountIndex:
+    with _accounts_lock:
+        if root not in _accounts:
+            _accounts[root] = AccountIndex(root)
+        index = _accounts[root]
+    return index.get()
+
+
+def gidc(gid, root: str = "/") -> bool:
     if gid is False:
         return True
     elif isinstance(gid, int):
         gid = str(gid)
     elif not gid.isdigit():
         raise TypeError("GID not a number!")
-    with open("/etc/group") as gr:
-        data = gr.read().split("\n")
-        for i in data:
-            try:
-                if i.split(":")[-2] == gid:
-                    return True
-            except IndexError:
-                pass
-    return False
-
-
-def uidc(uid: str) -> bool:
+    return gid in account_index(root).gids
+
+
+def uidc(uid: str, root: str = "/") -> bool:
     if uid is False:
         return True
     if isinstance(uid, int):
         uid = str(uid)
     elif not uid.isdigit():
         raise TypeError("UID not a number!")
-    with open("/etc/passwd") as pw:
-        data = pw.read().split("\n")
-        for i in data:
-            try:
-                if i.split(":")[2] == uid:
-                    return True
-            except IndexError:
-                pass
-    return False
-
-
-def shells() -> set:
-    res = set()
-    with open("/etc/shells") as sh:
-        data = sh.read().split("\n")
-        for i in data:
-            if i.startswith("/"):
-                res.add(i)
-    return res
+    return uid in account_index(root).uids
+
+
+def shells(root: str = "/") -> set:
+    return account_index(root).shells
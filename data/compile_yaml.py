@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+#
+# Copyright 2025 BredOS
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Pre-parses the package lists into marshal blobs, and bundles them in the
+# optional org.bredos.bakery.marshal.gresource. The main gresource does not
+# depend on it, Bakery falls back to parsing the YAML when it is missing.
+#
+# Blob layout, read back by bakery.packages._load_yaml_resource:
+#   b"BKRY" | marshal.version (1 byte) | sha256 of the YAML source | payload
+
+import hashlib
+import marshal
+import subprocess
+import yaml
+from os import path
+
+MAGIC = b"BKRY"
+sources = ["packages.yaml", "desktops.yaml"]
+manifest = "org.bredos.bakery.marshal.gresource.xml"
+
+data_dir: str = path.dirname(path.realpath(__file__))
+
+
+def compile_yaml(src: str, dst: str) -> None:
+    """Writes the marshalled contents of src to dst."""
+    with open(src, "rb") as f:
+        raw = f.read()
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    data = yaml.load(raw.decode("utf-8"), Loader=loader)
+    with open(dst, "wb") as f:
+        f.write(MAGIC)
+        f.write(bytes([marshal.version]))
+        f.write(hashlib.sha256(raw).digest())
+        f.write(marshal.dumps(data))
+
+
+if __name__ == "__main__":
+    for i in sources:
+        compile_yaml(
+            path.join(data_dir, i),
+            path.join(data_dir, path.splitext(i)[0] + ".marshal"),
+        )
+    subprocess.run(["glib-compile-resources", manifest], cwd=data_dir, check=True)
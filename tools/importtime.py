@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#
+# Copyright 2025 BredOS
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Cold import profile of the installer entry points, using python -X importtime.
+#
+#   python tools/importtime.py          write tools/importtime-<ui>.txt
+#   python tools/importtime.py --check  fail if an entry point is over budget
+#
+# The profiles are local, for comparing before and after a change, and are not
+# checked in. The budget check is run by hand or in CI (make import-budget),
+# timings are too noisy for a commit hook. Each entry point is profiled a few
+# times and the fastest run is kept.
+
+import subprocess
+import sys
+from os import path
+
+repo_dir: str = path.dirname(path.dirname(path.realpath(__file__)))
+tools_dir: str = path.join(repo_dir, "tools")
+
+# ui -> (entry point, code that imports what it does before running, budget in ms)
+# The GUI registers its resources before importing the screens, like its
+# __main__ block does, the app itself is not started. Only already built
+# resources are registered, profiling never writes into data/.
+gresources = [
+    "data/org.bredos.bakery.gresource",
+    "data/org.bredos.bakery.marshal.gresource",
+]
+entry_points = {
+    "gui": (
+        "bakery-gui.py",
+        "import os, runpy; runpy.run_path('bakery-gui.py', run_name='bakery_gui');"
+        " from gi.repository import Gio;"
+        f" [Gio.Resource._register(Gio.Resource.load(f)) for f in {gresources!r}"
+        " if os.path.isfile(f)]; import bakery.gui.main",
+        1500,
+    ),
+    "tui": (
+        "bakery-tui.py",
+        "import runpy; runpy.run_path('bakery-tui.py', run_name='bakery_tui')",
+        1000,
+    ),
+}
+
+
+def profile(code: str) -> list:
+    """(self us, cumulative us, depth, name) for every module imported."""
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=repo_dir,
+        capture_output=True,
+        text=True,
+    )
+    if res.returncode:
+        raise RuntimeError(res.stderr.strip().split("\n")[-1])
+    entries = []
+    for line in res.stderr.split("\n"):
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((int(own), int(cumulative), depth, name.strip()))
+    return entries
+
+
+def total_ms(entries: list) -> float:
+    return sum(e[1] for e in entries if e[2] == 0) / 1000
+
+
+def best_profile(code: str, runs: int = 5) -> list:
+    """The fastest of several profiles, the others are mostly scheduler noise."""
+    return min((profile(code) for _ in range(runs)), key=total_ms)
+
+
+def write_profile(ui: str, entries: list, top: int = 40) -> None:
+    with open(path.join(tools_dir, "importtime-" + ui + ".txt"), "w") as f:
+        f.write(f"# {entry_points[ui][0]} on Python {sys.version.split()[0]}\n")
+        f.write(f"# total {total_ms(entries):.1f} ms\n")
+        f.write("# cumulative ms | self ms | module\n")
+        for own, cumulative, _, name in sorted(entries, key=lambda e: -e[1])[:top]:
+            f.write(f"{cumulative / 1000:10.1f} | {own / 1000:8.1f} | {name}\n")
+
+
+if __name__ == "__main__":
+    check = "--check" in sys.argv
+    if not path.isfile(path.join(repo_dir, gresources[0])):
+        sys.exit("No built gresource, run bakery-gui.py once first.")
+    over = False
+    for ui, (script, code, budget) in entry_points.items():
+        entries = best_profile(code)
+        ms = total_ms(entries)
+        print(f"{ui}: {ms:.1f} ms (budget {budget} ms)")
+        if check:
+            over |= ms > budget
+        else:
+            write_profile(ui, entries)
+    sys.exit(1 if over else 0)